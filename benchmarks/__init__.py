@@ -0,0 +1,17 @@
+"""
+BMO performance benchmarks.
+
+Install the dependencies with `pip install -r benchmarks/requirements.txt`,
+then run from the repository root, e.g. `python -m benchmarks.ann_recall`.
+Each benchmark prints a JSON report so runs can be diffed or compared in CI.
+"""
+import os
+import sys
+
+AI_SERVICE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services", "ai-service")
+
+
+def use_ai_service_modules():
+    """Make the AI service's flat modules (vector_index, ...) importable"""
+    if AI_SERVICE_DIR not in sys.path:
+        sys.path.insert(0, AI_SERVICE_DIR)
@@ -0,0 +1,104 @@
+"""
+Recall vs latency of the IVF index against exact search.
+
+    python -m benchmarks.ann_recall --rows 50000 --dim 768 --probes 1 2 4 8 16 32
+
+Uses a synthetic clustered corpus by default; pass `--vectors file.npy` to
+benchmark real embeddings (queries are then perturbed corpus rows).
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks import use_ai_service_modules
+
+use_ai_service_modules()
+from vector_index import ExactIndex, IVFIndex  # noqa: E402
+
+
+def synthetic_corpus(rows: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=rows)
+    return (centers[labels] + 0.6 * rng.normal(size=(rows, dim))).astype(np.float32)
+
+
+def percentile_ms(samples, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000.0)
+
+
+def run_queries(index, queries: np.ndarray, top_k: int, **search_args):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(query, top_k, **search_args)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids)
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="Optional .npy matrix of real embeddings")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0, help="IVF lists (0 = sqrt(rows))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.vectors:
+        corpus = np.load(args.vectors).astype(np.float32)
+    else:
+        corpus = synthetic_corpus(args.rows, args.dim, args.clusters, rng)
+    picks = rng.choice(corpus.shape[0], args.queries, replace=False)
+    queries = corpus[picks] + 0.3 * rng.normal(size=(args.queries, corpus.shape[1])).astype(np.float32)
+
+    exact = ExactIndex()
+    exact.build(corpus)
+    truth, exact_latencies = run_queries(exact, queries, args.top_k)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(n_lists=args.lists or None, seed=args.seed)
+    ivf.build(corpus)
+    build_seconds = time.perf_counter() - start
+
+    report = {
+        "rows": int(corpus.shape[0]),
+        "dim": int(corpus.shape[1]),
+        "queries": args.queries,
+        "top_k": args.top_k,
+        "ivf_lists": int(ivf.centroids.shape[0]),
+        "ivf_build_seconds": round(build_seconds, 3),
+        "exact": {
+            "recall": 1.0,
+            "p50_ms": percentile_ms(exact_latencies, 50),
+            "p95_ms": percentile_ms(exact_latencies, 95)
+        },
+        "ivf": []
+    }
+
+    for n_probe in args.probes:
+        found, latencies = run_queries(ivf, queries, args.top_k, n_probe=n_probe)
+        recall = np.mean([
+            len(set(ids.tolist()) & set(expected.tolist())) / len(expected)
+            for ids, expected in zip(found, truth)
+        ])
+        report["ivf"].append({
+            "n_probe": n_probe,
+            "recall": round(float(recall), 4),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "speedup_p50": percentile_ms(exact_latencies, 50) / max(percentile_ms(latencies, 50), 1e-9)
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Throughput and latency of the gateway -> AI service -> voice chain.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.load_test --concurrency 1 8 32 --requests 200
+
+Starts the real gateway and AI service as subprocesses (uvicorn) against
+local stand-ins: a fake Ollama and a fake voice/TTS service running in this
+process (see `benchmarks.stand_ins`), and redis-server or fakeredis unless
+`--redis-url` is given. It then drives `/ai/chat`, `/chat-complete` and
+`/voice/text-to-speech` through the gateway at each concurrency level and
+prints a JSON report: p50/p95/p99 latency, throughput and error rate per
+scenario, plus how many calls reached the stand-ins.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+from benchmarks import AI_SERVICE_DIR
+from benchmarks.stand_ins import ServerThread, fake_ollama_app, fake_voice_app, free_port, start_redis
+
+SERVICES_DIR = os.path.dirname(AI_SERVICE_DIR)
+
+MESSAGES = [
+    "عسلامة BMO، شنية أحوالك اليوم؟",
+    "تعبت برشا من الخدمة",
+    "شنوة نعمل في الويكاند؟",
+    "نحب نتعلم الطبخ التونسي",
+    "عندي امتحان غدوة و أنا خايف برشا",
+    "شكرا برشا على المساعدة",
+    "وقتاش يخرج القطار لسوسة؟",
+    "احكيلي حكاية صغيرة"
+]
+EMOTIONS = ["happy", "sad", "angry", "surprised", "tired", "excited", "neutral"]
+
+
+def chat_body(args, i: int) -> dict:
+    return {
+        "message": MESSAGES[i % len(MESSAGES)],
+        "session_id": f"load-{i % args.sessions}",
+        "language": "ar"
+    }
+
+
+def tts_body(args, i: int) -> dict:
+    return {
+        "text": MESSAGES[i % len(MESSAGES)],
+        "emotion": EMOTIONS[i % len(EMOTIONS)],
+        "language": "ar-TN"
+    }
+
+
+SCENARIOS = {
+    "chat": ("/ai/chat", chat_body),
+    "chat_complete": ("/chat-complete", chat_body),
+    "tts": ("/voice/text-to-speech", tts_body)
+}
+
+
+def start_service(name: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=os.path.join(SERVICES_DIR, name),
+        env={**os.environ, **env}
+    )
+
+
+def wait_until_ready(process: subprocess.Popen, url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url}: service exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{url} not ready after {timeout}s")
+        time.sleep(0.2)
+
+
+def stop_service(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10.0)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def summarize(latencies_ms, statuses: Counter, wall_seconds: float, concurrency: int) -> dict:
+    total = sum(statuses.values())
+    errors = total - statuses.get("200", 0)
+    samples = np.array(latencies_ms) if latencies_ms else None
+
+    def percentile(q):
+        return round(float(np.percentile(samples, q)), 2) if samples is not None else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "status_counts": dict(statuses),
+        "throughput_rps": round(statuses.get("200", 0) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "p99": percentile(99),
+            "max": round(float(samples.max()), 2) if samples is not None else None
+        }
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, url: str, make_body, args,
+                       concurrency: int, requests: int) -> dict:
+    """Send `requests` requests from `concurrency` workers; latency counts successful ones only"""
+    latencies_ms, statuses = [], Counter()
+    counter = itertools.count()
+
+    async def worker():
+        while (i := next(counter)) < requests:
+            body = make_body(args, i)
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            statuses[status] += 1
+            if status == "200":
+                latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies_ms, statuses, time.perf_counter() - started, concurrency)
+
+
+async def drive(gateway_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    results = {}
+    async with httpx.AsyncClient(base_url=gateway_url, timeout=args.timeout, limits=limits) as client:
+        for name in args.scenarios:
+            path, make_body = SCENARIOS[name]
+            results[name] = []
+            for concurrency in args.concurrency:
+                if args.warmup:
+                    await run_scenario(client, path, make_body, args, concurrency, args.warmup)
+                results[name].append(await run_scenario(client, path, make_body, args, concurrency, args.requests))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario and concurrency")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each run")
+    parser.add_argument("--sessions", type=int, default=50, help="Distinct chat session ids to spread requests over")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="Fake Ollama time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake Ollama generation rate")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--embed-ms", type=float, default=10.0, help="Fake Ollama /api/embed latency")
+    parser.add_argument("--embed-dim", type=int, default=384)
+    parser.add_argument("--tts-ms", type=float, default=150.0, help="Fake TTS latency")
+    parser.add_argument("--redis-url", default=None, help="Use this Redis instead of starting one")
+    parser.add_argument("--snapshot", default="", help="DATASET_SNAPSHOT for the AI service (default: offline examples)")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    ollama = ServerThread(fake_ollama_app(
+        first_token_ms=args.first_token_ms,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        embed_ms=args.embed_ms,
+        embed_dim=args.embed_dim
+    )).start()
+    voice = ServerThread(fake_voice_app(latency_ms=args.tts_ms)).start()
+    if args.redis_url:
+        redis_url, redis_kind, stop_redis = args.redis_url, "external", lambda: None
+    else:
+        redis_url, redis_kind, stop_redis = start_redis()
+
+    ai_port, gateway_port = free_port(), free_port()
+    services = []
+    try:
+        ai = start_service("ai-service", ai_port, {
+            "OLLAMA_BASE_URL": ollama.url,
+            "REDIS_URL": redis_url,
+            "DATASET_SNAPSHOT": args.snapshot,
+            "EMBEDDING_CACHE_DIR": "",
+            "VECTOR_INDEX_DIR": "",
+            "HF_DATASETS_OFFLINE": "1"
+        })
+        services.append(ai)
+        gateway = start_service("gateway", gateway_port, {
+            "AI_SERVICE_URL": f"http://127.0.0.1:{ai_port}",
+            "VOICE_SERVICE_URL": voice.url,
+            "TASK_SERVICE_URL": f"http://127.0.0.1:{free_port()}"
+        })
+        services.append(gateway)
+        wait_until_ready(ai, f"http://127.0.0.1:{ai_port}/readyz", args.ready_timeout)
+        wait_until_ready(gateway, f"http://127.0.0.1:{gateway_port}/", args.ready_timeout)
+
+        results = asyncio.run(drive(f"http://127.0.0.1:{gateway_port}", args))
+    finally:
+        for process in services:
+            stop_service(process)
+        voice.stop()
+        ollama.stop()
+        stop_redis()
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "redis_url"},
+        "redis": redis_kind,
+        "scenarios": results,
+        "upstream_calls": {
+            "ollama": dict(ollama.app.state.calls),
+            "tts": dict(voice.app.state.calls)
+        }
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Ollama prompt-eval time: persona-first system prompt vs the previous layout.
+
+    python -m benchmarks.prompt_prefix --ollama-url http://localhost:11434 --turns 12
+
+The previous layout put the per-turn context (name, emotion, retrieved
+dialogue and proverbs) in the middle of the persona text, so the prompt
+diverged after a few hundred bytes on every turn. The current one sends
+`BMO_PERSONA` byte-identical first and the turn context after it, which
+Ollama can serve from its KV cache. Each layout runs its turns back to back
+against a live Ollama (first turn excluded as warm-up).
+"""
+import argparse
+import json
+import os
+import statistics
+
+import httpx
+
+from benchmarks import use_ai_service_modules
+
+use_ai_service_modules()
+os.environ.setdefault("EMBEDDING_CACHE_DIR", "")
+import main as ai  # noqa: E402
+
+MESSAGES = [
+    "عسلامة BMO، شنية أحوالك اليوم؟",
+    "تعبت برشا من الخدمة",
+    "شنوة نعمل في الويكاند؟",
+    "نحب نتعلم الطبخ التونسي",
+    "الطقس سخون ياسر اليوم",
+    "عندي امتحان غدوة و أنا متوتر",
+    "شكرا برشا على المساعدة",
+    "احكيلي حكاية صغيرة"
+]
+EMOTIONS = ["happy", "tired", "confused", "excited", "happy", "nervous", "grateful", "happy"]
+
+
+def turn_context(turn: int):
+    return {
+        "name": "Sami",
+        "interactions": turn + 1,
+        "emotion": EMOTIONS[turn % len(EMOTIONS)],
+        "intent": "general",
+        "dialogues": [{"text": MESSAGES[(turn + 3) % len(MESSAGES)], "speaker": "user", "intent": "general"}],
+        "proverb": "من زرع حصد",
+        "emotion_proverb": "الصبر مفتاح الفرج"
+    }
+
+
+def context_block(context) -> str:
+    return f"""USER CONTEXT:
+- Name: {context['name']}
+- Interactions: {context['interactions']}
+- Current emotion detected: {context['emotion']}
+- User intent: {context['intent']}
+
+DIALOGUE EXAMPLES (similar to current topic):
+{json.dumps(context['dialogues'], ensure_ascii=False, indent=2)}
+
+TUNISIAN CULTURAL WISDOM (use if relevant):
+- Proverb: {context['proverb']}
+- Emotion wisdom: {context['emotion_proverb']}"""
+
+
+def legacy_prompt(context) -> str:
+    """Context between LANGUAGE and RESPOND, as the prompt used to be laid out"""
+    head, respond = ai.BMO_PERSONA.split("\n\nRESPOND:")
+    return f"{head}\n\n{context_block(context)}\n\nRESPOND:{respond}"
+
+
+def prefix_prompt(context) -> str:
+    return f"{ai.BMO_PERSONA}\n\n{context_block(context)}"
+
+
+def run_layout(client: httpx.Client, args, build_prompt):
+    history, samples = [], []
+    for turn in range(args.turns + 1):
+        message = MESSAGES[turn % len(MESSAGES)]
+        messages = [{"role": "system", "content": build_prompt(turn_context(turn))}]
+        messages += history[-6:] + [{"role": "user", "content": message}]
+        response = client.post(f"{args.ollama_url}/api/chat", json={
+            "model": args.model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": args.keep_alive,
+            "options": {"temperature": 0.7, "top_p": 0.9, "num_predict": args.num_predict}
+        })
+        response.raise_for_status()
+        result = response.json()
+        reply = result.get("message", {}).get("content", "")
+        history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+        if turn:  # the first turn loads the model / fills the cache
+            samples.append((result.get("prompt_eval_duration", 0) / 1e6, result.get("prompt_eval_count", 0)))
+
+    eval_ms = [ms for ms, _ in samples]
+    tokens = [count for _, count in samples]
+    return {
+        "turns": len(samples),
+        "prompt_eval_p50_ms": statistics.median(eval_ms),
+        "prompt_eval_mean_ms": statistics.fmean(eval_ms),
+        "prompt_eval_tokens_p50": statistics.median(tokens)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ollama-url", default=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
+    parser.add_argument("--model", default=ai.OLLAMA_MODEL)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--num-predict", type=int, default=32)
+    parser.add_argument("--keep-alive", default="30m")
+    args = parser.parse_args()
+
+    with httpx.Client(timeout=300.0) as client:
+        report = {
+            "model": args.model,
+            "context_in_middle": run_layout(client, args, legacy_prompt),
+            "persona_prefix": run_layout(client, args, prefix_prompt)
+        }
+    old, new = report["context_in_middle"], report["persona_prefix"]
+    report["prompt_eval_speedup_p50"] = old["prompt_eval_p50_ms"] / max(new["prompt_eval_p50_ms"], 1e-9)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Local stand-ins for the upstreams the services call, for load tests.
+
+- `fake_ollama_app`: Ollama's `/api/chat` (streaming or not) and `/api/embed`,
+  with a fixed time to first token, a token rate and deterministic embeddings.
+- `fake_voice_app`: the voice service's TTS surface (`/text-to-speech`,
+  `/voice-config`, `/health`), standing in for Google Cloud / eSpeak.
+- `start_redis`: a throwaway Redis, `redis-server` when installed, else
+  fakeredis served over TCP so separate service processes can share it.
+
+Each app runs in this process on its own thread (`ServerThread`), so the
+load generator's event loop does not also have to serve the fakes.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    from fakeredis import TcpFakeServer
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+REPLY_WORDS = ["تمام", "برشا", "مليح", "ياسر", "توا", "BMO", "يعيشك", "صاحبي"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+            time.sleep(0.05)
+
+
+class ServerThread:
+    """Serve an ASGI app with uvicorn on a daemon thread"""
+
+    def __init__(self, app, port: Optional[int] = None):
+        self.app = app
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self) -> "ServerThread":
+        self.thread.start()
+        deadline = time.monotonic() + 10.0
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"stand-in server on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5.0)
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic pseudo-embedding: the same text always gets the same vector"""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    return [rng.gauss(0.0, 1.0) for _ in range(dim)]
+
+
+def fake_ollama_app(first_token_ms: float = 200.0, tokens_per_second: float = 50.0,
+                    reply_tokens: int = 40, embed_ms: float = 10.0, embed_dim: int = 384) -> FastAPI:
+    """Ollama stand-in; `app.state.calls` counts requests per endpoint"""
+    app = FastAPI(title="Fake Ollama")
+    app.state.calls = Counter()
+
+    def chat_result(model: str, content: str, prompt_tokens: int, eval_tokens: int) -> dict:
+        return {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(first_token_ms * 1e6),
+            "eval_count": eval_tokens,
+            "eval_duration": int(eval_tokens / tokens_per_second * 1e9)
+        }
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.calls["chat"] += 1
+        model = body.get("model", "fake")
+        tokens = max(0, min(reply_tokens, body.get("options", {}).get("num_predict", reply_tokens)))
+        words = [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(tokens)]
+        prompt_tokens = sum(len(str(msg.get("content", "")).split()) for msg in body.get("messages", []))
+
+        if not body.get("stream", True):  # Ollama streams unless told otherwise
+            await asyncio.sleep(first_token_ms / 1000 + tokens / tokens_per_second)
+            return chat_result(model, " ".join(words), prompt_tokens, tokens)
+
+        async def chunks():
+            await asyncio.sleep(first_token_ms / 1000)
+            for position, word in enumerate(words):
+                if position:
+                    await asyncio.sleep(1 / tokens_per_second)
+                chunk = {"model": model, "message": {"role": "assistant", "content": word + " "}, "done": False}
+                yield json.dumps(chunk, ensure_ascii=False) + "\n"
+            yield json.dumps(chat_result(model, "", prompt_tokens, tokens)) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        app.state.calls["embed"] += 1
+        app.state.calls["embed_inputs"] += len(inputs)
+        await asyncio.sleep(embed_ms / 1000)
+        return {
+            "model": body.get("model", "fake"),
+            "embeddings": [fake_embedding(text, embed_dim) for text in inputs]
+        }
+
+    return app
+
+
+def fake_voice_app(latency_ms: float = 150.0, bytes_per_char: int = 200) -> FastAPI:
+    """Voice-service stand-in returning silent MP3-sized payloads after `latency_ms`"""
+    app = FastAPI(title="Fake Voice Service")
+    app.state.calls = Counter()
+
+    @app.post("/text-to-speech")
+    async def text_to_speech(request: Request):
+        body = await request.json()
+        app.state.calls["tts"] += 1
+        await asyncio.sleep(latency_ms / 1000)
+        audio = b"\xff\xfb" + bytes(len(body.get("text", "")) * bytes_per_char)
+        return Response(audio, media_type="audio/mpeg")
+
+    @app.get("/voice-config")
+    async def voice_config():
+        return {"emotions": ["neutral"], "languages": ["ar-TN"], "tts_provider": "stand-in"}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "service": "bmo-voice-stand-in"}
+
+    return app
+
+
+def start_redis() -> Tuple[str, str, Callable[[], None]]:
+    """Start a throwaway Redis; returns (url, kind, stop)"""
+    port = free_port()
+    if shutil.which("redis-server"):
+        process = subprocess.Popen(
+            ["redis-server", "--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        wait_for_port(port)
+
+        def stop():
+            process.terminate()
+            process.wait(timeout=5.0)
+        return f"redis://127.0.0.1:{port}", "redis-server", stop
+
+    if FAKEREDIS_AVAILABLE:
+        server = TcpFakeServer(("127.0.0.1", port))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        wait_for_port(port)
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+        return f"redis://127.0.0.1:{port}", "fakeredis", stop
+
+    raise RuntimeError("Need redis-server on PATH or `pip install fakeredis`, or pass --redis-url")
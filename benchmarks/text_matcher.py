@@ -0,0 +1,107 @@
+"""
+Single-pass emotion/intent matcher vs the per-keyword scan it replaced.
+
+    python -m benchmarks.text_matcher --lengths 50 500 5000 20000
+
+Every generated message is checked to score identically under both
+implementations before timings are reported.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+from collections import defaultdict
+
+from benchmarks import use_ai_service_modules
+
+use_ai_service_modules()
+os.environ.setdefault("EMBEDDING_CACHE_DIR", "")
+import main as ai  # noqa: E402
+
+
+def legacy_scores(text: str):
+    """Emotion and intent scoring as detect_emotion/detect_intent did it per table entry"""
+    text_lower = text.lower()
+    scores = defaultdict(float)
+    for emotion, patterns_data in ai.EMOTION_PATTERNS.items():
+        keyword_count = sum(1 for keyword in patterns_data["keywords"] if keyword in text_lower)
+        scores[emotion] += keyword_count * 2
+        for pattern in patterns_data["patterns"]:
+            if re.search(pattern, text_lower):
+                scores[emotion] += 3
+
+    text_lower = text.lower()
+    intent_scores = defaultdict(int)
+    for intent, keywords in ai.INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                intent_scores[intent] += 1
+    return ai.best_emotion(scores), ai.best_intent(intent_scores)
+
+
+def single_pass_scores(text: str):
+    emotion_scores, intent_scores = ai.score_text(text)
+    return ai.best_emotion(emotion_scores), ai.best_intent(intent_scores)
+
+
+FILLER = [
+    "في", "الدار", "اليوم", "نمشي", "الخدمة", "و", "مع", "الصغار", "غدوة", "البارح",
+    "القهوة", "الماتش", "الكار", "المدرسة", "الطقس", "سخون", "بارد", "الفلوس", "الجامعة",
+    "bonjour", "ça", "va", "normal", "déjà", "le", "travail", "weekend", "2024", "ok"
+]
+
+
+def make_message(length: int, keywords, keyword_ratio: float, rng: random.Random) -> str:
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(keywords) if rng.random() < keyword_ratio else rng.choice(FILLER)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def time_per_call(fn, messages, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            fn(message)
+    return (time.perf_counter() - start) / (repeat * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[50, 500, 5000, 20000])
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keyword-ratio", type=float, default=0.05,
+                        help="Share of words drawn from the keyword tables (1.0 = keyword soup)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keywords = [keyword for data in ai.EMOTION_PATTERNS.values() for keyword in data["keywords"]]
+    keywords += [keyword for words in ai.INTENT_KEYWORDS.values() for keyword in words]
+
+    report = {"keyword_ratio": args.keyword_ratio, "lengths": []}
+    for length in args.lengths:
+        messages = [make_message(length, keywords, args.keyword_ratio, rng) for _ in range(args.messages)]
+        mismatches = sum(legacy_scores(m) != single_pass_scores(m) for m in messages)
+
+        legacy = time_per_call(legacy_scores, messages, args.repeat)
+        single = time_per_call(single_pass_scores, messages, args.repeat)
+        report["lengths"].append({
+            "chars": length,
+            "mismatches": mismatches,
+            "legacy_us": round(legacy * 1e6, 2),
+            "single_pass_us": round(single * 1e6, 2),
+            "speedup": round(legacy / single, 2)
+        })
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Offline snapshot of the dialogue and proverb corpora.
+
+Build once where HuggingFace (and optionally Ollama) is reachable:
+
+    python dataset_snapshot.py --output cache/datasets.snapshot --embeddings
+
+(add `--backend local` to store the in-process n-gram embeddings instead
+of Ollama's, for EMBEDDING_BACKEND=local deployments)
+
+The result is one file the AI service memory-maps at startup instead of
+calling `datasets.load_dataset`:
+
+    b"BMOSNAP1" | uint64 header length | JSON header | 64-byte aligned arrays
+    (array offsets in the header are relative to the first aligned byte after it)
+
+Every string (texts, speakers, intents, splits, prompts, JSON-encoded
+entities) is interned once into a UTF-8 pool (`strings.data` +
+`strings.offsets`); table columns are int32 ids into that pool. Optional
+embeddings are stored as a float32 matrix keyed by string id, tagged with
+the embedding model that produced them.
+"""
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BMOSNAP1"
+VERSION = 1
+ALIGNMENT = 64
+
+DIALOGUES_DATASET = "samfatnassi/Tunisian-Railway-Dialogues"
+PROVERBS_DATASET = "Heubub/Tunisian-Proverbs-with-Image-Associations-A-Cultural-and-Linguistic-Dataset"
+
+# column -> kind ("str": interned string, "json": interned JSON, "int": int32, -1 = missing)
+DIALOGUE_COLUMNS = {"text": "str", "speaker": "str", "intent": "str", "entities": "json", "split": "str"}
+PROVERB_COLUMNS = {"text": "str", "prompt": "str", "split": "str", "id": "int", "image": "str"}
+
+
+def iter_dialogue_rows(dataset) -> Iterator[Dict]:
+    """Flatten the railway dialogues dataset into one dict per turn"""
+    for split in dataset.keys():
+        for example in dataset[split]:
+            for turn in example.get('dialogue', []):
+                yield {
+                    'text': turn.get('text', ''),
+                    'speaker': turn.get('speaker', ''),
+                    'intent': turn.get('intent', 'general'),
+                    'entities': turn.get('entities', {}),
+                    'split': split
+                }
+
+
+def iter_proverb_rows(dataset) -> Iterator[Dict]:
+    """One dict per non-empty proverb; `image` is the first associated image path, if any"""
+    for split in dataset.keys():
+        for idx, example in enumerate(dataset[split]):
+            proverb_text = example.get('tunisan_proverb', '')
+            if proverb_text:
+                yield {
+                    'text': proverb_text,
+                    'prompt': example.get('prompt', ''),
+                    'split': split,
+                    'id': idx,
+                    'image': example.get('image_path_1')
+                }
+
+
+class StringPool:
+    """Intern strings into one UTF-8 blob plus offsets"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.encoded: List[bytes] = []
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.encoded)
+            self.encoded.append(value.encode("utf-8"))
+        return string_id
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        offsets = np.zeros(len(self.encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in self.encoded], out=offsets[1:])
+        return {
+            "strings.data": np.frombuffer(b"".join(self.encoded), dtype=np.uint8),
+            "strings.offsets": offsets
+        }
+
+
+def _encode_table(name: str, rows: Iterable[Dict], columns: Dict[str, str],
+                  pool: StringPool, arrays: Dict[str, np.ndarray]) -> int:
+    values = {column: [] for column in columns}
+    count = 0
+    for row in rows:
+        count += 1
+        for column, kind in columns.items():
+            value = row.get(column)
+            if kind == "json":
+                value = pool.intern(json.dumps(value if value is not None else {}, ensure_ascii=False, sort_keys=True))
+            elif kind == "str":
+                value = pool.intern(str(value) if value is not None else None)
+            else:
+                value = int(value) if value is not None else -1
+            values[column].append(value)
+    for column, column_values in values.items():
+        arrays[f"{name}.{column}"] = np.asarray(column_values, dtype=np.int32)
+    return count
+
+
+def write_snapshot(path: str, dialogues: Iterable[Dict], proverbs: Iterable[Dict],
+                   embeddings: Optional[Dict[str, np.ndarray]] = None,
+                   embedding_model: Optional[str] = None) -> Dict:
+    """Encode both corpora (and optional text -> vector embeddings) into one snapshot file"""
+    pool = StringPool()
+    arrays: Dict[str, np.ndarray] = {}
+    tables = {
+        "dialogues": {"rows": _encode_table("dialogues", dialogues, DIALOGUE_COLUMNS, pool, arrays),
+                      "columns": DIALOGUE_COLUMNS},
+        "proverbs": {"rows": _encode_table("proverbs", proverbs, PROVERB_COLUMNS, pool, arrays),
+                     "columns": PROVERB_COLUMNS}
+    }
+
+    if embeddings:
+        string_ids = [pool.ids[text] for text in embeddings if text in pool.ids]
+        order = np.argsort(string_ids)
+        texts = [text for text in embeddings if text in pool.ids]
+        arrays["embeddings.string_ids"] = np.asarray(string_ids, dtype=np.int32)[order]
+        arrays["embeddings.vectors"] = np.vstack([
+            np.asarray(embeddings[texts[position]], dtype=np.float32) for position in order
+        ])
+    arrays.update(pool.arrays())
+
+    header = {
+        "version": VERSION,
+        "created": datetime.now().isoformat(),
+        "tables": tables,
+        "embedding_model": embedding_model if embeddings else None,
+        "arrays": {}
+    }
+    # Array offsets are relative to the first aligned byte after the header
+    relative = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": relative}
+        relative = _align(relative + array.nbytes)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(MAGIC)
+        snapshot_file.write(struct.pack("<Q", len(header_bytes)))
+        snapshot_file.write(header_bytes)
+        for name, array in arrays.items():
+            snapshot_file.seek(data_start + header["arrays"][name]["offset"])
+            snapshot_file.write(np.ascontiguousarray(array).tobytes())
+        snapshot_file.truncate(data_start + relative)  # covers trailing empty arrays
+    os.replace(temp_path, path)
+    return header
+
+
+def _align(position: int) -> int:
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SnapshotRecords(Sequence):
+    """Read-only row view over one snapshot table; rows are decoded on access"""
+
+    def __init__(self, snapshot: "DatasetSnapshot", table: str, exclude: Iterable[str] = ()):
+        spec = snapshot.header["tables"][table]
+        self.snapshot = snapshot
+        self.rows = spec["rows"]
+        self.all_columns = [
+            (column, kind, snapshot.arrays[f"{table}.{column}"]) for column, kind in spec["columns"].items()
+        ]
+        # Excluded columns stay readable through `column()` but are left out of rows
+        exclude = set(exclude)
+        self.columns = [entry for entry in self.all_columns if entry[0] not in exclude]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _row(self, position: int) -> Dict:
+        row = {}
+        for column, kind, values in self.columns:
+            value = int(values[position])
+            if kind == "int":
+                row[column] = value if value != -1 else None
+            elif value == -1:
+                row[column] = None
+            elif kind == "json":
+                row[column] = json.loads(self.snapshot.string(value))
+            else:
+                row[column] = self.snapshot.string(value)
+        return row
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._row(index) for index in range(*position.indices(self.rows))]
+        if position < 0:
+            position += self.rows
+        if not 0 <= position < self.rows:
+            raise IndexError(position)
+        return self._row(position)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for position in range(self.rows):
+            yield self._row(position)
+
+    def column(self, name: str) -> List[Optional[str]]:
+        """All values of one string column, decoded once per distinct string"""
+        for column, kind, values in self.all_columns:
+            if column == name:
+                return [self.snapshot.string(int(value)) if value != -1 else None for value in values]
+        raise KeyError(name)
+
+
+class DatasetSnapshot:
+    """Memory-mapped snapshot file written by `write_snapshot`"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a dataset snapshot")
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(bytes(self._mmap[start:start + header_length]).decode("utf-8"))
+        if self.header.get("version") != VERSION:
+            self._mmap.close()
+            raise ValueError(f"Unsupported snapshot version {self.header.get('version')}")
+
+        data_start = _align(start + header_length)
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, spec in self.header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"])) if spec["shape"] else 1
+            self.arrays[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+
+        self._strings_data = self.arrays["strings.data"]
+        self._strings_offsets = self.arrays["strings.offsets"]
+        self._decoded: Dict[int, str] = {}
+        self._string_ids: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def open(cls, path: Optional[str]) -> Optional["DatasetSnapshot"]:
+        """Open the snapshot at `path`, or return None when it is absent or unreadable"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            snapshot = cls(path)
+            logger.info(f"Opened dataset snapshot {path} ({snapshot.header.get('created')})")
+            return snapshot
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable dataset snapshot {path}: {e}")
+            return None
+
+    def string(self, string_id: int) -> str:
+        value = self._decoded.get(string_id)
+        if value is None:
+            start, end = self._strings_offsets[string_id], self._strings_offsets[string_id + 1]
+            value = self._decoded[string_id] = self._strings_data[start:end].tobytes().decode("utf-8")
+        return value
+
+    def has_table(self, table: str) -> bool:
+        return self.header["tables"].get(table, {}).get("rows", 0) > 0
+
+    def records(self, table: str, exclude: Iterable[str] = ()) -> SnapshotRecords:
+        return SnapshotRecords(self, table, exclude)
+
+    def vectors_for(self, texts: List[str], model: str) -> Optional[np.ndarray]:
+        """Precomputed embeddings for `texts`, if every one was embedded with `model`"""
+        if self.header.get("embedding_model") != model or "embeddings.vectors" not in self.arrays:
+            return None
+        if self._string_ids is None:
+            self._string_ids = {self.string(i): i for i in range(len(self._strings_offsets) - 1)}
+
+        embedded_ids = self.arrays["embeddings.string_ids"]
+        string_ids = np.asarray([self._string_ids.get(text, -1) for text in texts], dtype=np.int32)
+        rows = np.searchsorted(embedded_ids, string_ids)
+        rows = np.minimum(rows, len(embedded_ids) - 1)
+        if (string_ids < 0).any() or (embedded_ids[rows] != string_ids).any():
+            return None
+        return self.arrays["embeddings.vectors"][rows]
+
+    def close(self):
+        self.arrays.clear()
+        self._strings_data = self._strings_offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # rows still referenced elsewhere; the mapping goes away with them
+
+
+def embed_texts(texts: List[str], ollama_url: str, model: str, batch_size: int) -> Dict[str, np.ndarray]:
+    import httpx
+
+    embeddings = {}
+    with httpx.Client(timeout=120.0) as client:
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            response = client.post(f"{ollama_url}/api/embed", json={"model": model, "input": batch})
+            response.raise_for_status()
+            for text, vector in zip(batch, response.json()["embeddings"]):
+                embeddings[text] = np.asarray(vector, dtype=np.float32)
+            logger.info(f"Embedded {min(start + batch_size, len(texts))}/{len(texts)} texts")
+    return embeddings
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the offline dataset snapshot for the AI service")
+    parser.add_argument("--output", default=os.getenv("DATASET_SNAPSHOT", "cache/datasets.snapshot"))
+    parser.add_argument("--embeddings", action="store_true", help="Also store embeddings of every distinct text")
+    parser.add_argument("--ollama-url", default=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
+    parser.add_argument("--model", default=os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text"))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")))
+    parser.add_argument("--backend", choices=["ollama", "local"], default=os.getenv("EMBEDDING_BACKEND", "ollama"))
+    args = parser.parse_args()
+
+    from datasets import load_dataset
+
+    dialogues = list(iter_dialogue_rows(load_dataset(DIALOGUES_DATASET)))
+    proverbs = list(iter_proverb_rows(load_dataset(PROVERBS_DATASET)))
+    logger.info(f"Exporting {len(dialogues)} dialogue turns and {len(proverbs)} proverbs")
+
+    embeddings, model = None, args.model
+    if args.embeddings:
+        texts = list(dict.fromkeys(row["text"] for row in dialogues + proverbs if row["text"]))
+        if args.backend == "local":
+            from local_embedding import LocalEmbedder
+
+            embedder = LocalEmbedder(dim=int(os.getenv("LOCAL_EMBEDDING_DIM", "384")))
+            embeddings, model = dict(zip(texts, embedder.embed_batch(texts))), embedder.model_id
+        else:
+            embeddings = embed_texts(texts, args.ollama_url, args.model, args.batch_size)
+
+    write_snapshot(args.output, dialogues, proverbs, embeddings, model)
+    logger.info(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
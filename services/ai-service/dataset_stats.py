@@ -0,0 +1,60 @@
+"""
+Per-corpus counts for the stats endpoints, maintained as rows are loaded.
+
+Counts by field (intent, speaker, split, category, ...) are taken once when
+a corpus is loaded and bumped by `add_rows` / `add_columns` as rows are
+added, so /dialogue-stats and /proverb-stats never walk the corpus. Every
+change re-renders the JSON body and its ETag, a hash of that body: every
+replica serving the same corpus hands out the same tag, and pollers that
+send it back in If-None-Match get 304 Not Modified.
+"""
+from collections import Counter
+from typing import Dict, Iterable, Optional
+import hashlib
+import json
+
+
+class CorpusStats:
+    """Row total and per-field value counts for one corpus, with a rendered body and ETag"""
+
+    def __init__(self, total_name: str, fields: Dict[str, str], **extra):
+        """`fields` maps each output name to the row field it counts, e.g. {"intents": "intent"}"""
+        self.total_name = total_name
+        self.fields = fields
+        self.total = 0
+        self.counts: Dict[str, Counter] = {name: Counter() for name in fields}
+        self.extra = extra
+        self._render()
+
+    def add_columns(self, rows: int, columns: Dict[str, Iterable[Optional[str]]]):
+        """Count `rows` new rows given as one value list per row field"""
+        self.total += rows
+        for name, field in self.fields.items():
+            if field in columns:
+                self.counts[name].update(value or "unknown" for value in columns[field])
+        self._render()
+
+    def add_rows(self, rows: Iterable[Dict]):
+        rows = list(rows)
+        self.add_columns(len(rows), {
+            field: [row.get(field) for row in rows] for field in self.fields.values()
+        })
+
+    def update(self, **extra):
+        """Set fields reported alongside the counts (loaded flag, ...)"""
+        self.extra.update(extra)
+        self._render()
+
+    def _render(self):
+        payload = {self.total_name: self.total}
+        payload.update((name, dict(counts)) for name, counts in self.counts.items())
+        payload.update(self.extra)
+        self.body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header already names the current body"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
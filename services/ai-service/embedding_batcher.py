@@ -0,0 +1,107 @@
+"""
+Micro-batching coalescer for embedding requests.
+
+Concurrent coroutines that each need one embedding enqueue their text here.
+Pending texts are flushed as a single batched call either when the batching
+window elapses or as soon as `max_batch_size` texts are waiting, and each
+resulting vector is routed back to the future its caller is awaiting.
+"""
+from typing import Awaitable, Callable, Dict, List, Tuple
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EmbedBatchFn = Callable[[List[str]], Awaitable[List[np.ndarray]]]
+
+
+class EmbeddingBatcher:
+    """Coalesce single-text embedding calls into batched upstream requests"""
+
+    def __init__(self, embed_batch: EmbedBatchFn, window_ms: float = 5.0, max_batch_size: int = 32):
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+
+        self.batches_sent = 0
+        self.texts_sent = 0
+        self.requests = 0
+        self.max_queue_depth = 0
+        self.largest_batch = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Queue `text` for the next batch and wait for its vector"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Identical texts in the same window share one upstream slot
+        waiters: Dict[str, List[asyncio.Future]] = {}
+        for text, future in batch:
+            if not future.done():
+                waiters.setdefault(text, []).append(future)
+        if not waiters:
+            return
+
+        texts = list(waiters.keys())
+        self.batches_sent += 1
+        self.texts_sent += len(texts)
+        self.largest_batch = max(self.largest_batch, len(texts))
+
+        try:
+            vectors = await self.embed_batch(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            for futures in waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for text, vector in zip(texts, vectors):
+            for future in waiters[text]:
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight_batches": len(self._tasks),
+            "requests": self.requests,
+            "batches_sent": self.batches_sent,
+            "texts_sent": self.texts_sent,
+            "largest_batch": self.largest_batch,
+            "avg_batch_size": self.texts_sent / self.batches_sent if self.batches_sent else 0.0,
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size
+        }
@@ -0,0 +1,188 @@
+"""
+Content-addressed embedding cache for the BMO AI service.
+
+Vectors are keyed by a hash of (model, text) and kept in two tiers:
+- an in-process LRU for hot strings (greetings, the query of the moment)
+- an append-only float32 file on disk, read through a memory map, with a
+  small text index of `key offset length` lines so entries survive restarts
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
+import mmap
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FLOAT_SIZE = np.dtype(np.float32).itemsize
+
+
+class DiskEmbeddingStore:
+    """Append-only memory-mapped vector file plus key index"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.txt")
+        self.entries: Dict[str, Tuple[int, int]] = {}
+        self._mmap = None
+        self._mapped_floats = 0
+
+        self._size = self._load_index()
+        self._vectors_file = open(self.vectors_path, "ab")
+        self._index_file = open(self.index_path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _load_index(self) -> int:
+        """Read the index and drop any vector bytes written after the last indexed entry"""
+        end = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as index_file:
+                for line in index_file:
+                    parts = line.split()
+                    if len(parts) != 3:
+                        continue  # torn write from an interrupted append
+                    key, offset, length = parts[0], int(parts[1]), int(parts[2])
+                    self.entries[key] = (offset, length)
+                    end = max(end, offset + length)
+
+        vectors_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if vectors_bytes < end * FLOAT_SIZE:
+            logger.warning("Embedding cache vectors file is shorter than its index, resetting")
+            self.entries.clear()
+            end = 0
+        if vectors_bytes != end * FLOAT_SIZE:
+            with open(self.vectors_path, "ab") as vectors_file:
+                vectors_file.truncate(end * FLOAT_SIZE)
+        if not self.entries:
+            open(self.index_path, "w").close()
+        return end
+
+    def _remap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = None
+        self._mapped_floats = 0
+        if self._size:
+            with open(self.vectors_path, "rb") as vectors_file:
+                self._mmap = mmap.mmap(vectors_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_floats = len(self._mmap) // FLOAT_SIZE
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        offset, length = entry
+        if offset + length > self._mapped_floats:
+            self._remap()
+        return np.frombuffer(self._mmap, dtype=np.float32, count=length, offset=offset * FLOAT_SIZE).copy()
+
+    def put(self, key: str, vector: np.ndarray):
+        if key in self.entries:
+            return
+
+        data = np.ascontiguousarray(vector, dtype=np.float32).ravel()
+        offset = self._size
+        # Vector bytes first, index line second: a crash can only leave
+        # unindexed trailing bytes, which _load_index truncates away
+        self._vectors_file.write(data.tobytes())
+        self._vectors_file.flush()
+        self._index_file.write(f"{key} {offset} {data.shape[0]}\n")
+        self._index_file.flush()
+
+        self.entries[key] = (offset, data.shape[0])
+        self._size += data.shape[0]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._vectors_file.close()
+        self._index_file.close()
+
+
+class EmbeddingCache:
+    """Two-tier (LRU memory + mmap disk) embedding cache keyed by (model, text)"""
+
+    def __init__(self, capacity: int = 4096, directory: Optional[str] = None):
+        self.capacity = capacity
+        self.memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.disk = None
+        if directory:
+            try:
+                self.disk = DiskEmbeddingStore(directory)
+                logger.info(f"Embedding cache on disk: {directory} ({len(self.disk)} entries)")
+            except OSError as e:
+                logger.warning(f"Embedding disk cache unavailable ({e}), using memory only")
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def contains(self, model: str, text: str) -> bool:
+        """Check for an entry without touching LRU order or counters"""
+        key = self.make_key(model, text)
+        return key in self.memory or (self.disk is not None and key in self.disk.entries)
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = self.make_key(model, text)
+
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    def put(self, model: str, text: str, vector: np.ndarray):
+        key = self.make_key(model, text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, vector)
+            except OSError as e:
+                logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else 0
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
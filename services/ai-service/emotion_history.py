@@ -0,0 +1,122 @@
+"""
+Bounded emotion history and incrementally maintained emotion statistics.
+
+Detected emotions are kept out of the user profile JSON:
+- the raw events go to a capped Redis stream, one compact entry per turn
+  (epoch seconds, emotion id, confidence)
+- per-emotion counts and confidence sums are bumped in the same pipeline,
+  all-time and per UTC day, so summaries never replay the raw events
+
+Keys:
+    emotion_history:{session_id}          -> stream, MAXLEN ~maxlen
+    emotion_stats:{session_id}            -> hash {emotion}, {emotion}:conf
+    emotion_stats:{session_id}:{YYYYMMDD} -> hash {emotion} (expires after the largest window)
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+WINDOWS_DAYS = (1, 7, 30)
+
+
+class EmotionHistory:
+    """Capped per-session emotion stream plus rolling per-emotion counters"""
+
+    def __init__(self, emotions: Sequence[str], maxlen: int = 200, ttl: int = 3600 * 24 * 30):
+        # Ids are positions in `emotions`: only ever append new emotions
+        self.emotions = list(emotions)
+        self.emotion_ids = {emotion: index for index, emotion in enumerate(self.emotions)}
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self.redis = None
+
+    @staticmethod
+    def _day(moment: datetime) -> str:
+        return moment.astimezone(timezone.utc).strftime("%Y%m%d")
+
+    def add(self, pipe, session_id: str, emotion: str, confidence: float,
+            timestamp: Optional[datetime] = None):
+        """Queue one emotion event on an existing Redis pipeline"""
+        emotion = str(getattr(emotion, "value", emotion))
+        if emotion not in self.emotion_ids:
+            return
+        moment = timestamp or datetime.now(timezone.utc)
+        if moment.tzinfo is None:
+            moment = moment.astimezone()
+
+        stream_key = f"emotion_history:{session_id}"
+        stats_key = f"emotion_stats:{session_id}"
+        day_key = f"{stats_key}:{self._day(moment)}"
+
+        pipe.xadd(stream_key, {
+            "t": int(moment.timestamp()),
+            "e": self.emotion_ids[emotion],
+            "c": round(float(confidence), 3)
+        }, maxlen=self.maxlen, approximate=True)
+        pipe.expire(stream_key, self.ttl)
+        pipe.hincrby(stats_key, emotion, 1)
+        pipe.hincrbyfloat(stats_key, f"{emotion}:conf", float(confidence))
+        pipe.expire(stats_key, self.ttl)
+        pipe.hincrby(day_key, emotion, 1)
+        pipe.expire(day_key, 3600 * 24 * (max(WINDOWS_DAYS) + 1))
+
+    def add_legacy(self, pipe, session_id: str, events: List[Dict]):
+        """Queue the most recent entries of an old in-profile `emotion_history` list"""
+        for event in events[-self.maxlen:]:
+            try:
+                timestamp = datetime.fromisoformat(event["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                timestamp = None
+            self.add(pipe, session_id, event.get("emotion"), event.get("confidence", 0.0), timestamp)
+
+    async def recent(self, session_id: str, count: int = 10) -> List[Dict]:
+        """Most recent events, newest first"""
+        entries = await self.redis.xrevrange(f"emotion_history:{session_id}", count=count)
+        events = []
+        for _, fields in entries:
+            emotion_id = int(fields["e"])
+            events.append({
+                "emotion": self.emotions[emotion_id] if emotion_id < len(self.emotions) else None,
+                "confidence": float(fields["c"]),
+                "timestamp": datetime.fromtimestamp(int(fields["t"]), timezone.utc).isoformat()
+            })
+        return events
+
+    async def summary(self, session_id: str, recent: int = 10) -> Dict:
+        """Per-emotion counts (all time and per window), average confidence and recent events"""
+        try:
+            stats_key = f"emotion_stats:{session_id}"
+            today = datetime.now(timezone.utc)
+            days = [self._day(today - timedelta(days=offset)) for offset in range(max(WINDOWS_DAYS))]
+
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hgetall(stats_key)
+            for day in days:
+                pipe.hgetall(f"{stats_key}:{day}")
+            totals, *daily = await pipe.execute()
+
+            counts = {emotion: int(totals[emotion]) for emotion in self.emotions if emotion in totals}
+            windows = {}
+            for window in WINDOWS_DAYS:
+                window_counts: Dict[str, int] = {}
+                for day_counts in daily[:window]:
+                    for emotion, count in day_counts.items():
+                        window_counts[emotion] = window_counts.get(emotion, 0) + int(count)
+                windows[f"{window}d"] = window_counts
+
+            return {
+                "total": sum(counts.values()),
+                "counts": counts,
+                "average_confidence": {
+                    emotion: float(totals.get(f"{emotion}:conf", 0.0)) / count
+                    for emotion, count in counts.items()
+                },
+                "dominant": max(counts, key=counts.get) if counts else None,
+                "windows": windows,
+                "recent": await self.recent(session_id, recent)
+            }
+        except Exception as e:
+            logger.error(f"Error summarizing emotion history: {e}")
+            return {}
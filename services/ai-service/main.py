@@ -1,21 +1,45 @@
-from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Tuple
+from typing import AsyncIterator, Callable, List, Optional, Dict, Tuple
 import httpx
 import os
 import asyncio
+import random
 import redis.asyncio as redis
+from redis.exceptions import ResponseError, WatchError
 import json
+import hashlib
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import logging
 from enum import Enum
 
 # ML/NLP imports
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-import re
-from collections import defaultdict
+from collections import defaultdict, deque
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from dataset_snapshot import (
+    DIALOGUES_DATASET, PROVERBS_DATASET, DatasetSnapshot, iter_dialogue_rows, iter_proverb_rows
+)
+from dataset_stats import CorpusStats
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+from emotion_history import EmotionHistory
+from local_embedding import LocalEmbedder
+from metrics import LATENCY_BUCKETS, RequestMetrics, request_histogram
+from ollama_scheduler import BACKGROUND, INTERACTIVE, PRIORITIES, OllamaScheduler, SchedulerOverloaded
+from pattern_matcher import MultiPatternMatcher
+from profile_cache import ProfileCache, encode_profile
+from response_cache import ResponseCache
+from single_flight import SingleFlight, fingerprint
+from vector_index import ExactIndex, create_index, load_index
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +47,12 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="BMO Enhanced AI Service")
 
+# Prometheus metrics, served on /metrics
+app.add_middleware(RequestMetrics, histogram=request_histogram(
+    "bmo_ai_http_request_duration_seconds",
+    "AI service request latency by route (to the end of the response body)"
+))
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -36,11 +66,223 @@ app.add_middleware(
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:1b")
 OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+# How long Ollama keeps both models loaded after a request ("30m", "1h", seconds, or -1 = forever)
+_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_KEEP_ALIVE = int(_keep_alive) if _keep_alive.lstrip("-").isdigit() else _keep_alive
+# Admission control: concurrent Ollama requests, queued requests, and how long
+# an interactive request may wait for a slot before it is turned away with 503
+OLLAMA_MAX_IN_FLIGHT = int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "2"))
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "32"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "10"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# "ollama", or "local" for in-process hashed n-gram vectors (no model server).
+# The local embedder is also the fallback when Ollama embedding fails.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")
+local_embedder = LocalEmbedder(dim=int(os.getenv("LOCAL_EMBEDDING_DIM", "384")))
+# Tags corpus vectors (snapshot, persisted indexes) with what produced them
+EMBEDDING_MODEL_ID = local_embedder.model_id if EMBEDDING_BACKEND == "local" else OLLAMA_EMBEDDING_MODEL
+DATASET_SNAPSHOT = os.getenv("DATASET_SNAPSHOT", "cache/datasets.snapshot")
 ollama_client = httpx.AsyncClient(timeout=30.0)
 
+# Vector index: "exact", "ivf" or "auto" (IVF once a corpus reaches ANN_MIN_ROWS)
+VECTOR_INDEX_KIND = os.getenv("VECTOR_INDEX_KIND", "auto")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "cache/indexes")
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "5000"))
+IVF_NLISTS = int(os.getenv("IVF_NLISTS", "0")) or None
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+
+# Embedding cache: in-process LRU + persistent memory-mapped store
+embedding_cache = EmbeddingCache(
+    capacity=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+    directory=os.getenv("EMBEDDING_CACHE_DIR", "cache/embeddings") or None
+)
+
 # Redis for memory and dialogue cache
 redis_client = None
 
+# Every call to Ollama goes through this scheduler
+ollama_scheduler = OllamaScheduler(
+    max_in_flight=OLLAMA_MAX_IN_FLIGHT,
+    max_queue=OLLAMA_MAX_QUEUE,
+    queue_timeout=OLLAMA_QUEUE_TIMEOUT
+)
+
+# Opt-in shared cache of chat replies (exact + near-duplicate messages)
+response_cache = ResponseCache(
+    enabled=os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true",
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000")),
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+)
+
+class StreamStats:
+    """Rolling time-to-first-token samples for /chat/stream"""
+    def __init__(self, window: int = 500):
+        self.first_token_ms = deque(maxlen=window)
+        self.streams = 0
+        self.errors = 0
+        self.first_token_seconds = Histogram(
+            "bmo_chat_stream_first_token_seconds",
+            "Time from /chat/stream request to the first generated token",
+            buckets=LATENCY_BUCKETS
+        )
+    
+    def record_first_token(self, ms: float):
+        self.streams += 1
+        self.first_token_ms.append(ms)
+        self.first_token_seconds.observe(ms / 1000)
+    
+    def summary(self) -> Dict:
+        samples = np.array(self.first_token_ms) if self.first_token_ms else None
+        return {
+            "streams": self.streams,
+            "errors": self.errors,
+            "ttft_p50_ms": float(np.percentile(samples, 50)) if samples is not None else None,
+            "ttft_p95_ms": float(np.percentile(samples, 95)) if samples is not None else None
+        }
+
+stream_stats = StreamStats()
+
+class StageTimings:
+    """Per-stage latency of the chat pipeline: rolling samples for /health,
+    cumulative histograms for /metrics"""
+    def __init__(self, window: int = 500):
+        self.window = window
+        self.samples: Dict[str, deque] = {}
+        self.histogram = Histogram(
+            "bmo_chat_stage_seconds",
+            "Time spent in each stage of a chat turn",
+            ("stage",), buckets=LATENCY_BUCKETS
+        )
+    
+    def record(self, stage: str, ms: float):
+        if stage not in self.samples:
+            self.samples[stage] = deque(maxlen=self.window)
+        self.samples[stage].append(ms)
+        self.histogram.labels(stage=stage).observe(ms / 1000)
+    
+    @contextmanager
+    def time(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - started) * 1000)
+    
+    def summary(self) -> Dict:
+        return {
+            stage: {
+                "count": len(samples),
+                "p50_ms": float(np.percentile(samples, 50)),
+                "p95_ms": float(np.percentile(samples, 95))
+            }
+            for stage, samples in self.samples.items() if samples
+        }
+
+stage_timings = StageTimings()
+
+TOKEN_RATE_BUCKETS = (1, 2.5, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+class OllamaStats:
+    """Rolling samples of Ollama's own timings for chat generations"""
+    def __init__(self, window: int = 500):
+        self.prompt_eval_ms = deque(maxlen=window)
+        self.prompt_eval_tokens = deque(maxlen=window)
+        self.load_ms = deque(maxlen=window)
+        self.tokens_per_second = deque(maxlen=window)
+        
+        self.prompt_eval_seconds = Histogram(
+            "bmo_ollama_prompt_eval_seconds", "Ollama prompt evaluation time per chat generation",
+            buckets=LATENCY_BUCKETS
+        )
+        self.load_seconds = Histogram(
+            "bmo_ollama_load_seconds", "Ollama model load time per chat generation",
+            buckets=LATENCY_BUCKETS
+        )
+        self.generation_rate = Histogram(
+            "bmo_ollama_eval_tokens_per_second", "Ollama generation speed per chat generation",
+            buckets=TOKEN_RATE_BUCKETS
+        )
+        self.tokens = Counter(
+            "bmo_ollama_tokens_total", "Tokens Ollama evaluated for chat generations", ("phase",)
+        )
+    
+    def record(self, result: Dict):
+        """Sample a finished /api/chat response (durations are in nanoseconds)"""
+        if "prompt_eval_duration" in result:
+            self.prompt_eval_ms.append(result["prompt_eval_duration"] / 1e6)
+            self.prompt_eval_tokens.append(result.get("prompt_eval_count", 0))
+            self.prompt_eval_seconds.observe(result["prompt_eval_duration"] / 1e9)
+            self.tokens.labels(phase="prompt").inc(result.get("prompt_eval_count", 0))
+        if "load_duration" in result:
+            self.load_ms.append(result["load_duration"] / 1e6)
+            self.load_seconds.observe(result["load_duration"] / 1e9)
+        if result.get("eval_duration"):
+            rate = result.get("eval_count", 0) / (result["eval_duration"] / 1e9)
+            self.tokens_per_second.append(rate)
+            self.generation_rate.observe(rate)
+            self.tokens.labels(phase="eval").inc(result.get("eval_count", 0))
+    
+    def summary(self) -> Dict:
+        def percentile(samples, q):
+            return float(np.percentile(samples, q)) if samples else None
+        return {
+            "generations": len(self.prompt_eval_ms),
+            "prompt_eval_p50_ms": percentile(self.prompt_eval_ms, 50),
+            "prompt_eval_p95_ms": percentile(self.prompt_eval_ms, 95),
+            "prompt_eval_tokens_p50": percentile(self.prompt_eval_tokens, 50),
+            "eval_tokens_per_second_p50": percentile(self.tokens_per_second, 50),
+            "load_p95_ms": percentile(self.load_ms, 95)
+        }
+
+ollama_stats = OllamaStats()
+
+class WarmupState:
+    """Progress of the background start-up work that gates /readyz"""
+    REQUIRED = ("redis", "dialogues", "proverbs")
+    PHASES = REQUIRED + ("models",)  # model warm-up is best effort
+    
+    def __init__(self):
+        self.phases = {name: {"status": "pending"} for name in self.PHASES}
+        self.started = time.perf_counter()
+        self.task: Optional[asyncio.Task] = None
+    
+    @property
+    def ready(self) -> bool:
+        return all(self.phases[name]["status"] == "done" for name in self.REQUIRED)
+    
+    @property
+    def retrieval_ready(self) -> bool:
+        return self.phases["dialogues"]["status"] == "done" and self.phases["proverbs"]["status"] == "done"
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Track one start-up phase; a failure is recorded and logged, not raised"""
+        state = self.phases[name]
+        state.update(status="running")
+        started = time.perf_counter()
+        try:
+            yield state
+            state["status"] = "done"
+        except Exception as e:
+            logger.error(f"Warm-up phase {name} failed: {e}")
+            state.update(status="failed", error=str(e))
+        finally:
+            state["seconds"] = round(time.perf_counter() - started, 3)
+    
+    def progress(self, name: str, done: int, total: int):
+        self.phases[name].update(done=done, total=total)
+    
+    def summary(self) -> Dict:
+        statuses = {self.phases[name]["status"] for name in self.REQUIRED}
+        return {
+            "status": "ready" if self.ready else "failed" if "failed" in statuses else "warming",
+            "uptime_seconds": round(time.perf_counter() - self.started, 3),
+            "phases": self.phases
+        }
+
+warmup = WarmupState()
+
 # Emotion enum for better emotion tracking
 class EmotionType(str, Enum):
     HAPPY = "happy"
@@ -138,6 +380,8 @@ class ChatResponse(BaseModel):
     detected_emotion: str
     confidence: float
     learned_something: bool = False
+    from_cache: bool = False
+    warming_up: bool = False
 
 class UserProfile(BaseModel):
     name: str
@@ -149,44 +393,84 @@ class UserProfile(BaseModel):
 # ==========================================
 # DIALOGUE DATASET LOADING
 # ==========================================
+# Stats output name -> row field counted, for /dialogue-stats and /proverb-stats
+DIALOGUE_STAT_FIELDS = {"intents": "intent", "speakers": "speaker", "splits": "split"}
+PROVERB_STAT_FIELDS = {"categories": "prompt", "splits": "split"}
+
+def corpus_stats(records, total_name: str, fields: Dict[str, str], **extra) -> CorpusStats:
+    """Count a freshly loaded corpus (snapshot tables column by column)"""
+    stats = CorpusStats(total_name, fields, **extra)
+    if isinstance(records, list):
+        stats.add_rows(records)
+    else:
+        stats.add_columns(len(records), {field: records.column(field) for field in fields.values()})
+    return stats
+
 class DialogueDatabase:
     def __init__(self):
         self.dialogues = []
-        self.embeddings = []
+        self.index = ExactIndex()
+        self.index_rows = []  # index row -> dialogue positions sharing that text
         self.loaded = False
+        self.source = None
+        self.stats = CorpusStats("total_dialogues", DIALOGUE_STAT_FIELDS, loaded=False)
     
-    async def load_dialogues(self):
-        """Load Tunisian Railway Dialogues dataset from HuggingFace"""
+    async def _publish(self, dialogues, source: str, snapshot: Optional[DatasetSnapshot] = None):
+        """Index a freshly loaded corpus, then swap it in with no await in between"""
+        stats = corpus_stats(dialogues, "total_dialogues", DIALOGUE_STAT_FIELDS, loaded=True)
+        index, index_rows = await self._build_index(dialogues, snapshot)
+        self.dialogues, self.index, self.index_rows, self.stats = dialogues, index, index_rows, stats
+        self.loaded = True
+        self.source = source
+    
+    async def load_dialogues(self, snapshot: Optional[DatasetSnapshot] = None):
+        """Load Tunisian Railway Dialogues from the offline snapshot, else from HuggingFace"""
+        if snapshot is not None and snapshot.has_table("dialogues"):
+            await self._publish(snapshot.records("dialogues"), "snapshot", snapshot)
+            logger.info(f"Loaded {len(self.dialogues)} dialogue turns from snapshot")
+            return
+        
         try:
             logger.info("Loading Tunisian Railway Dialogues dataset...")
             from datasets import load_dataset
             
             # Load the dataset
-            dataset = load_dataset("samfatnassi/Tunisian-Railway-Dialogues")
+            dataset = load_dataset(DIALOGUES_DATASET)
             
             # Extract dialogues
-            for split in dataset.keys():
-                for example in dataset[split]:
-                    for turn in example.get('dialogue', []):
-                        self.dialogues.append({
-                            'text': turn.get('text', ''),
-                            'speaker': turn.get('speaker', ''),
-                            'intent': turn.get('intent', 'general'),
-                            'entities': turn.get('entities', {}),
-                            'split': split
-                        })
-            
+            await self._publish(list(iter_dialogue_rows(dataset)), "huggingface")
             logger.info(f"Loaded {len(self.dialogues)} dialogue turns")
-            self.loaded = True
             
         except Exception as e:
             logger.error(f"Failed to load dataset: {e}")
             logger.info("Using offline dialogue examples instead")
-            self._load_offline_dialogues()
+            await self._load_offline_dialogues()
+    
+    async def _build_index(self, dialogues, snapshot: Optional[DatasetSnapshot] = None):
+        """Embed every distinct dialogue text once into a normalized matrix"""
+        if isinstance(dialogues, list):
+            dialogue_texts = [dialogue.get('text', '') for dialogue in dialogues]
+        else:
+            dialogue_texts = dialogues.column('text')  # decode each distinct string once
+        
+        rows_by_text = {}
+        for position, text in enumerate(dialogue_texts):
+            if text:
+                rows_by_text.setdefault(text, []).append(position)
+        if not rows_by_text:
+            return ExactIndex(), []
+        
+        texts = list(rows_by_text.keys())
+        vectors = snapshot.vectors_for(texts, EMBEDDING_MODEL_ID) if snapshot is not None else None
+        index = await build_vector_index(
+            "dialogues", texts, vectors,
+            progress=lambda done, total: warmup.progress("dialogues", done, total)
+        )
+        return index, [rows_by_text[text] for text in texts]
     
-    def _load_offline_dialogues(self):
+    async def _load_offline_dialogues(self):
         """Load example dialogues as fallback"""
-        self.dialogues = [
+        dialogues = [
             {
                 'text': 'البسة أشنوة؟',
                 'speaker': 'user',
@@ -212,33 +496,21 @@ class DialogueDatabase:
                 'entities': {'info_type': 'schedule'}
             }
         ]
-        self.loaded = True
+        await self._publish(dialogues, "offline")
     
-    async def find_similar_dialogue(self, query: str, top_k: int = 3) -> List[Dict]:
+    async def find_similar_dialogue(self, query: str, top_k: int = 3,
+                                    query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
         """Find similar dialogue examples using semantic similarity"""
-        if not self.dialogues:
+        dialogues, index, index_rows = self.dialogues, self.index, self.index_rows
+        if not dialogues or len(index) == 0:
             return []
         
         try:
-            # Get embedding for query
-            query_embedding = await get_embedding(query)
-            
-            # Simple similarity search
-            similar = []
-            for dialogue in self.dialogues[:50]:  # Search first 50 for speed
-                dialogue_text = dialogue.get('text', '')
-                if dialogue_text:
-                    dialogue_embedding = await get_embedding(dialogue_text)
-                    similarity = cosine_similarity(
-                        [query_embedding], 
-                        [dialogue_embedding]
-                    )[0][0]
-                    
-                    similar.append((dialogue, similarity))
-            
-            # Return top-k most similar
-            similar.sort(key=lambda x: x[1], reverse=True)
-            return [item[0] for item in similar[:top_k]]
+            # One embedding call for the query (unless the caller has it), then a single vectorized search
+            # (off the event loop, so it overlaps the other chat stages and its timeout can fire)
+            query_embedding = await embed_query_for(index, query, query_embedding)
+            row_ids, _ = await asyncio.to_thread(index.search, query_embedding, top_k)
+            return [dialogues[index_rows[row][0]] for row in row_ids]
         
         except Exception as e:
             logger.error(f"Error finding similar dialogue: {e}")
@@ -249,51 +521,138 @@ dialogue_db = DialogueDatabase()
 # ==========================================
 # TUNISIAN PROVERBS DATABASE
 # ==========================================
+# Proverb categories (the dataset's `prompt` field) that suit each emotion
+EMOTION_PROVERB_CATEGORIES = {
+    'happy': ['Happiness', 'Contentment', 'Friendship'],
+    'sad': ['Patience', 'Hope', 'Happiness'],
+    'angry': ['Patience', 'Peace', 'Wisdom'],
+    'confused': ['Knowledge', 'Wisdom', 'Understanding'],
+    'excited': ['Innovation', 'Hope', 'Success'],
+    'tired': ['Rest', 'Health', 'Balance'],
+    'nervous': ['Courage', 'Hope', 'Trust'],
+    'grateful': ['Gratitude', 'Contentment', 'Blessings']
+}
+
+# find_related_proverb: themed proverbs, offered when the message mentions a trigger word
+PROVERB_THEME_KEYWORDS = ['صحة', 'حب', 'علم', 'صديق', 'طيب']
+PROVERB_TRIGGER_WORDS = ['سعيد', 'حزن', 'سؤال', 'مشكل', 'حاجة']
+
+# Semantic proverb retrieval: nearest proverbs considered for the emotion filter
+PROVERB_CANDIDATES = int(os.getenv("PROVERB_CANDIDATES", "5"))
+
+class ProverbIndex:
+    """Category, emotion and theme keyword -> proverb positions, built once per corpus load"""
+    def __init__(self, proverbs):
+        by_category = defaultdict(list)
+        by_keyword = {keyword: [] for keyword in PROVERB_THEME_KEYWORDS}
+        for position, proverb in enumerate(proverbs):
+            by_category[proverb.get('prompt')].append(position)
+            text_lower = (proverb.get('text') or '').lower()
+            for keyword in PROVERB_THEME_KEYWORDS:
+                if keyword in text_lower:
+                    by_keyword[keyword].append(position)
+        
+        self.by_category: Dict[str, List[int]] = dict(by_category)
+        self.by_keyword: Dict[str, List[int]] = by_keyword
+        # Positions stay in corpus order, as the linear scans returned them
+        self.by_emotion: Dict[str, List[int]] = {
+            emotion: sorted({position for category in categories for position in self.by_category.get(category, [])})
+            for emotion, categories in EMOTION_PROVERB_CATEGORIES.items()
+        }
+        self.themed: List[int] = sorted({position for positions in by_keyword.values() for position in positions})
+    
+    def for_emotion(self, emotion: str, default_category: Optional[str] = None) -> List[int]:
+        positions = self.by_emotion.get(emotion)
+        if positions is None:
+            positions = self.by_category.get(default_category, []) if default_category else []
+        return positions
+
 class ProverbDatabase:
     """Load and manage Tunisian Proverbs with cultural context"""
     def __init__(self):
         self.proverbs = []
         self.loaded = False
+        self.source = None
         self.image_associations = {}
+        self.index = ProverbIndex([])
+        self.vector_index = ExactIndex()
+        self.vector_rows = []  # vector row -> proverb positions sharing that text
+        self.stats = CorpusStats("total_proverbs", PROVERB_STAT_FIELDS, loaded=False, image_associations=0)
+    
+    async def _publish(self, proverbs, image_associations: Dict[str, str], source: str,
+                       snapshot: Optional[DatasetSnapshot] = None):
+        """Index a freshly loaded corpus, then swap it in with no await in between"""
+        index = ProverbIndex(proverbs)
+        stats = corpus_stats(
+            proverbs, "total_proverbs", PROVERB_STAT_FIELDS,
+            loaded=True, image_associations=len(image_associations)
+        )
+        vector_index, vector_rows = await self._build_vector_index(proverbs, snapshot)
+        self.proverbs, self.image_associations, self.index = proverbs, image_associations, index
+        self.vector_index, self.vector_rows, self.stats = vector_index, vector_rows, stats
+        self.loaded = True
+        self.source = source
+    
+    async def _build_vector_index(self, proverbs, snapshot: Optional[DatasetSnapshot] = None):
+        """Embed every distinct proverb text once into a normalized matrix"""
+        rows_by_text = {}
+        for position, proverb in enumerate(proverbs):
+            text = proverb.get('text')
+            if text:
+                rows_by_text.setdefault(text, []).append(position)
+        if not rows_by_text:
+            return ExactIndex(), []
+        
+        texts = list(rows_by_text.keys())
+        vectors = snapshot.vectors_for(texts, EMBEDDING_MODEL_ID) if snapshot is not None else None
+        vector_index = await build_vector_index(
+            "proverbs", texts, vectors,
+            progress=lambda done, total: warmup.progress("proverbs", done, total)
+        )
+        return vector_index, [rows_by_text[text] for text in texts]
     
-    async def load_proverbs(self):
-        """Load Tunisian Proverbs dataset from HuggingFace"""
+    async def load_proverbs(self, snapshot: Optional[DatasetSnapshot] = None):
+        """Load Tunisian Proverbs from the offline snapshot, else from HuggingFace"""
+        if snapshot is not None and snapshot.has_table("proverbs"):
+            # Rows match the HuggingFace path: the image goes to `image_associations` only
+            proverbs = snapshot.records("proverbs", exclude=("image",))
+            image_associations = {
+                text: image
+                for text, image in zip(proverbs.column("text"), proverbs.column("image"))
+                if image is not None
+            }
+            await self._publish(proverbs, image_associations, "snapshot", snapshot)
+            logger.info(f"Loaded {len(self.proverbs)} Tunisian proverbs from snapshot")
+            return
+        
         try:
             logger.info("Loading Tunisian Proverbs dataset...")
             from datasets import load_dataset
             
             # Load the dataset
-            dataset = load_dataset("Heubub/Tunisian-Proverbs-with-Image-Associations-A-Cultural-and-Linguistic-Dataset")
+            dataset = load_dataset(PROVERBS_DATASET)
             
             # Extract proverbs
-            for split in dataset.keys():
-                for idx, example in enumerate(dataset[split]):
-                    proverb_text = example.get('tunisan_proverb', '')
-                    prompt = example.get('prompt', '')
-                    
-                    if proverb_text:
-                        self.proverbs.append({
-                            'text': proverb_text,
-                            'prompt': prompt,
-                            'split': split,
-                            'id': idx
-                        })
-                        
-                        # Store image association if available
-                        if 'image_path_1' in example:
-                            self.image_associations[proverb_text] = example.get('image_path_1')
+            proverbs = []
+            image_associations = {}
+            for proverb in iter_proverb_rows(dataset):
+                # Store image association if available
+                image = proverb.pop('image')
+                if image is not None:
+                    image_associations[proverb['text']] = image
+                proverbs.append(proverb)
             
+            await self._publish(proverbs, image_associations, "huggingface")
             logger.info(f"Loaded {len(self.proverbs)} Tunisian proverbs")
-            self.loaded = True
             
         except Exception as e:
             logger.error(f"Failed to load proverbs dataset: {e}")
             logger.info("Using offline proverb examples instead")
-            self._load_offline_proverbs()
+            await self._load_offline_proverbs()
     
-    def _load_offline_proverbs(self):
+    async def _load_offline_proverbs(self):
         """Load example proverbs as fallback"""
-        self.proverbs = [
+        proverbs = [
             {
                 'text': 'البيت الذي فيه حب فيه كل شي تمام',
                 'prompt': 'Home and Family',
@@ -335,27 +694,46 @@ class ProverbDatabase:
                 'split': 'offline'
             }
         ]
-        self.loaded = True
+        await self._publish(proverbs, {}, "offline")
     
-    async def find_related_proverb(self, query: str) -> Optional[Dict]:
-        """Find a proverb related to the user's message"""
+    async def find_related_proverb(self, query: str, query_embedding: Optional[np.ndarray] = None,
+                                   emotion: Optional[str] = None) -> Optional[Dict]:
+        """Find the proverb closest in meaning to the user's message
+        
+        Uses the query embedding already computed for dialogue retrieval;
+        with `emotion`, the best match among that emotion's categories wins
+        if one ranks near the top. Falls back to theme keywords, then random.
+        """
         if not self.proverbs:
             return None
         
         try:
-            # Simple keyword matching for cultural relevance
-            query_lower = query.lower()
+            proverbs, index = self.proverbs, self.index
+            vector_index, vector_rows = self.vector_index, self.vector_rows
+            
+            if query_embedding is not None and len(vector_index) > 0:
+                query_embedding = await embed_query_for(vector_index, query, query_embedding)
+                try:
+                    row_ids, _ = await asyncio.to_thread(vector_index.search, query_embedding, PROVERB_CANDIDATES)
+                except ValueError as e:
+                    logger.warning(f"Semantic proverb search unavailable: {e}")
+                    row_ids = []
+                candidates = [vector_rows[row][0] for row in row_ids]
+                if candidates:
+                    suited = set(index.for_emotion(emotion)) if emotion is not None else set()
+                    for position in candidates:
+                        if position in suited:
+                            return proverbs[position]
+                    return proverbs[candidates[0]]
             
-            for proverb in self.proverbs:
-                proverb_lower = proverb['text'].lower()
-                # Check for thematic relevance
-                if any(word in proverb_lower for word in ['صحة', 'حب', 'علم', 'صديق', 'طيب']):
-                    if any(word in query_lower for word in ['سعيد', 'حزن', 'سؤال', 'مشكل', 'حاجة']):
-                        return proverb
+            # Simple keyword matching for cultural relevance: the first themed
+            # proverb when the message calls for one
+            query_lower = query.lower()
+            if index.themed and any(word in query_lower for word in PROVERB_TRIGGER_WORDS):
+                return proverbs[index.themed[0]]
             
             # Return a random relevant proverb
-            import random
-            return random.choice(self.proverbs) if self.proverbs else None
+            return random.choice(proverbs) if proverbs else None
         
         except Exception as e:
             logger.error(f"Error finding related proverb: {e}")
@@ -363,26 +741,14 @@ class ProverbDatabase:
     
     def get_proverb_for_emotion(self, emotion: str) -> Optional[Dict]:
         """Get a proverb that matches the user's emotion"""
-        emotion_prompts = {
-            'happy': ['Happiness', 'Contentment', 'Friendship'],
-            'sad': ['Patience', 'Hope', 'Happiness'],
-            'angry': ['Patience', 'Peace', 'Wisdom'],
-            'confused': ['Knowledge', 'Wisdom', 'Understanding'],
-            'excited': ['Innovation', 'Hope', 'Success'],
-            'tired': ['Rest', 'Health', 'Balance'],
-            'nervous': ['Courage', 'Hope', 'Trust'],
-            'grateful': ['Gratitude', 'Contentment', 'Blessings']
-        }
-        
         try:
-            prompts = emotion_prompts.get(emotion, ['General'])
-            matching = [p for p in self.proverbs if p.get('prompt') in prompts]
+            proverbs, index = self.proverbs, self.index
+            matching = index.for_emotion(emotion, default_category='General')
             
             if matching:
-                import random
-                return random.choice(matching)
+                return proverbs[random.choice(matching)]
             
-            return random.choice(self.proverbs) if self.proverbs else None
+            return random.choice(proverbs) if proverbs else None
         
         except Exception as e:
             logger.error(f"Error getting emotion proverb: {e}")
@@ -393,49 +759,181 @@ proverb_db = ProverbDatabase()
 # ==========================================
 # EMBEDDINGS & SIMILARITY
 # ==========================================
-async def get_embedding(text: str) -> np.ndarray:
-    """Get embedding from Ollama"""
-    try:
+def _fallback_embedding(text: str) -> np.ndarray:
+    """Local n-gram embedding used when Ollama is unreachable"""
+    return local_embedder.embed(text)
+
+async def request_embeddings(texts: List[str], priority: int = INTERACTIVE) -> List[np.ndarray]:
+    """POST a batch of texts to Ollama /api/embed, raising on any failure"""
+    async with ollama_scheduler.slot(priority, timeout=None if priority == BACKGROUND else -1):
         response = await ollama_client.post(
             f"{OLLAMA_BASE_URL}/api/embed",
             json={
                 "model": OLLAMA_EMBEDDING_MODEL,
-                "input": text
+                "input": texts,
+                "keep_alive": OLLAMA_KEEP_ALIVE
             }
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return np.array(result.get("embeddings", [[]])[0])
-        else:
-            # Fallback to simple hash-based embedding
-            return np.array([hash(text) % 128 for _ in range(384)])
+    response.raise_for_status()
+    
+    embeddings = response.json().get("embeddings", [])
+    if len(embeddings) != len(texts):
+        raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+    return [np.array(embedding) for embedding in embeddings]
+
+# Concurrent single-text lookups are coalesced into one /api/embed call
+embedding_batcher = EmbeddingBatcher(
+    request_embeddings,
+    window_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")),
+    max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+)
+
+# Identical concurrent embedding / generation calls share one upstream request
+embedding_flights = SingleFlight()
+chat_flights = SingleFlight()
+
+async def get_embedding(text: str) -> np.ndarray:
+    """Get embedding from the cache, or from Ollama (batched) on a miss"""
+    if EMBEDDING_BACKEND == "local":
+        return local_embedder.embed(text)
+    
+    cached = embedding_cache.get(OLLAMA_EMBEDDING_MODEL, text)
+    if cached is not None:
+        return cached
+    
+    try:
+        embedding = await embedding_flights.do(
+            fingerprint(OLLAMA_EMBEDDING_MODEL, text),
+            lambda: embedding_batcher.embed(text)
+        )
+        if embedding.size:
+            embedding_cache.put(OLLAMA_EMBEDDING_MODEL, text, embedding)
+        return embedding
     except Exception as e:
+        # Fallback to simple hash-based embedding
         logger.warning(f"Embedding error: {e}, using fallback")
-        return np.array([hash(text) % 128 for _ in range(384)])
+        return _fallback_embedding(text)
+
+async def get_embeddings(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE,
+                         progress: Optional[Callable[[int, int], None]] = None) -> Tuple[np.ndarray, str]:
+    """Embed many texts with batched /api/embed calls, one row per text
+    
+    Returns the vectors and the id of the model that produced them: if any
+    batch fails, every text gets a local fallback vector instead, so the
+    rows always share one vector space.
+    """
+    if EMBEDDING_BACKEND == "local":
+        vectors = local_embedder.embed_batch(texts)
+        if progress:
+            progress(len(texts), len(texts))
+        return vectors, local_embedder.model_id
+    
+    rows = [embedding_cache.get(OLLAMA_EMBEDDING_MODEL, text) for text in texts]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if progress:
+        progress(len(texts) - len(missing), len(texts))
+    
+    fell_back = False
+    for start in range(0, len(missing), batch_size):
+        positions = missing[start:start + batch_size]
+        try:
+            embeddings = await request_embeddings([texts[i] for i in positions], priority=BACKGROUND)
+            for i, embedding in zip(positions, embeddings):
+                rows[i] = embedding
+                embedding_cache.put(OLLAMA_EMBEDDING_MODEL, texts[i], embedding)
+        except Exception as e:
+            logger.warning(f"Batch embedding error: {e}, using fallback")
+            fell_back = True
+        if progress:
+            progress(len(texts) - len(missing) + start + len(positions), len(texts))
+    
+    if fell_back or len({len(row) for row in rows}) > 1:
+        logger.warning("Embedding incomplete or mixed, using fallback for all texts")
+        return local_embedder.embed_batch(texts), local_embedder.model_id
+    
+    return np.array(rows, dtype=np.float32), OLLAMA_EMBEDDING_MODEL
+
+async def embed_query_for(index: ExactIndex, query: str, query_embedding: Optional[np.ndarray] = None) -> np.ndarray:
+    """Embed `query` with the model that built `index`
+    
+    An index built from fallback vectors (Ollama was down at load time) is
+    searched with local vectors, even once Ollama embeddings work again.
+    """
+    if EMBEDDING_BACKEND != "local" and index.metadata.get("model") == local_embedder.model_id:
+        return local_embedder.embed(query)
+    if query_embedding is None:
+        query_embedding = await get_embedding(query)
+    return query_embedding
+
+# ==========================================
+# VECTOR INDEXES
+# ==========================================
+def corpus_fingerprint(texts: List[str]) -> str:
+    """Identify a corpus + embedding model so persisted indexes are only reused when unchanged"""
+    digest = hashlib.sha256(EMBEDDING_MODEL_ID.encode("utf-8"))
+    for text in texts:
+        digest.update(b"\x00")
+        digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+async def build_vector_index(name: str, texts: List[str], vectors: Optional[np.ndarray] = None,
+                             progress: Optional[Callable[[int, int], None]] = None) -> ExactIndex:
+    """Load the persisted index for this exact corpus, or embed the texts and build one
+    
+    `vectors`, when given, are precomputed embeddings of `texts` (e.g. from the
+    dataset snapshot) and skip the embedding step.
+    """
+    fingerprint = corpus_fingerprint(texts)
+    config = f"{VECTOR_INDEX_KIND}:{ANN_MIN_ROWS}:{IVF_NLISTS}"
+    path = os.path.join(VECTOR_INDEX_DIR, f"{name}.npz") if VECTOR_INDEX_DIR else None
+    
+    if path and os.path.exists(path):
+        try:
+            index = load_index(path)
+            if index.metadata.get("fingerprint") == fingerprint and index.metadata.get("config") == config:
+                if hasattr(index, "n_probe"):
+                    index.n_probe = IVF_NPROBE
+                logger.info(f"Loaded {name} {index.kind} index from {path}: {len(index)} x {index.dim}")
+                return index
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable {name} index at {path}: {e}")
+    
+    model = EMBEDDING_MODEL_ID  # snapshot vectors are looked up by this id
+    if vectors is None:
+        logger.info(f"Embedding {len(texts)} distinct {name} texts...")
+        vectors, model = await get_embeddings(texts, progress=progress)
+    
+    index = create_index(
+        VECTOR_INDEX_KIND,
+        n_rows=len(texts),
+        ann_min_rows=ANN_MIN_ROWS,
+        n_lists=IVF_NLISTS,
+        n_probe=IVF_NPROBE
+    )
+    index.build(vectors)
+    index.metadata = {"fingerprint": fingerprint, "config": config, "model": model}
+    logger.info(f"{name} {index.kind} index ready: {len(index)} x {index.dim} ({model})")
+    
+    # Only persist indexes built from real embeddings (fallback vectors are never cached)
+    if path and model == EMBEDDING_MODEL_ID:
+        try:
+            os.makedirs(VECTOR_INDEX_DIR, exist_ok=True)
+            index.save(path)
+        except OSError as e:
+            logger.warning(f"Could not persist {name} index: {e}")
+    
+    return index
 
 # ==========================================
 # ADVANCED EMOTION DETECTION
 # ==========================================
 async def detect_emotion(text: str) -> Tuple[EmotionType, float]:
     """Detect emotion with multiple signals"""
-    text_lower = text.lower()
-    scores = defaultdict(float)
-    
-    # Check pattern matches
-    for emotion, patterns_data in EMOTION_PATTERNS.items():
-        # Keyword matching
-        keyword_count = sum(
-            1 for keyword in patterns_data["keywords"]
-            if keyword in text_lower
-        )
-        scores[emotion] += keyword_count * 2
-        
-        # Regex pattern matching
-        for pattern in patterns_data["patterns"]:
-            if re.search(pattern, text_lower):
-                scores[emotion] += 3
-    
+    emotion_scores, _ = score_text(text)
+    return best_emotion(emotion_scores)
+
+def best_emotion(scores: Dict[EmotionType, float]) -> Tuple[EmotionType, float]:
+    """Pick the top emotion and its confidence from keyword/pattern scores"""
     # If no emotion detected, default to interested
     if not scores:
         return EmotionType.INTERESTED, 0.5
@@ -465,14 +963,11 @@ INTENT_KEYWORDS = {
 
 async def detect_intent(text: str) -> Tuple[str, float]:
     """Detect user intent"""
-    text_lower = text.lower()
-    intent_scores = defaultdict(int)
-    
-    for intent, keywords in INTENT_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                intent_scores[intent] += 1
-    
+    _, intent_scores = score_text(text)
+    return best_intent(intent_scores)
+
+def best_intent(intent_scores: Dict[str, int]) -> Tuple[str, float]:
+    """Pick the top intent and its confidence from keyword counts"""
     if not intent_scores:
         return 'general', 0.3
     
@@ -481,137 +976,415 @@ async def detect_intent(text: str) -> Tuple[str, float]:
     
     return best_intent[0], confidence
 
+# ==========================================
+# SINGLE-PASS TEXT ANALYSIS
+# ==========================================
+def _build_text_matcher() -> MultiPatternMatcher:
+    """Compile EMOTION_PATTERNS and INTENT_KEYWORDS into one matcher"""
+    matcher = MultiPatternMatcher()
+    for emotion, patterns_data in EMOTION_PATTERNS.items():
+        for keyword in patterns_data["keywords"]:
+            matcher.add_keyword(keyword, ("emotion_keyword", emotion))
+        for pattern in patterns_data["patterns"]:
+            matcher.add_pattern(pattern, ("emotion_pattern", emotion))
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            matcher.add_keyword(keyword, ("intent", intent))
+    return matcher.compile()
+
+text_matcher = _build_text_matcher()
+
+def score_text(text: str) -> Tuple[Dict[EmotionType, float], Dict[str, int]]:
+    """Scan the message once and return (emotion scores, intent scores)"""
+    counts = text_matcher.scan(text.lower())
+    
+    # Every emotion gets a score (keywords count 2, patterns 3), in table order
+    emotion_scores = {
+        emotion: float(
+            counts.get(("emotion_keyword", emotion), 0) * 2 +
+            counts.get(("emotion_pattern", emotion), 0) * 3
+        )
+        for emotion in EMOTION_PATTERNS
+    }
+    # Only intents with at least one keyword hit, in table order
+    intent_scores = {
+        intent: counts[("intent", intent)]
+        for intent in INTENT_KEYWORDS
+        if ("intent", intent) in counts
+    }
+    return emotion_scores, intent_scores
+
+async def analyze_text(text: str) -> Tuple[EmotionType, float, str, float]:
+    """Detect emotion and intent together from a single scan"""
+    emotion_scores, intent_scores = score_text(text)
+    emotion, emotion_confidence = best_emotion(emotion_scores)
+    intent, intent_confidence = best_intent(intent_scores)
+    return emotion, emotion_confidence, intent, intent_confidence
+
 # ==========================================
 # REDIS OPERATIONS
 # ==========================================
 @app.on_event("startup")
 async def startup_event():
     global redis_client
-    try:
-        redis_client = await redis.from_url(
-            os.getenv("REDIS_URL", "redis://redis:6379"),
-            encoding="utf-8",
-            decode_responses=True
-        )
+    redis_client = await redis.from_url(
+        os.getenv("REDIS_URL", "redis://redis:6379"),
+        encoding="utf-8",
+        decode_responses=True
+    )
+    response_cache.redis = redis_client
+    emotion_history.redis = redis_client
+    profile_cache.start(redis_client)
+    
+    # Accept traffic right away; corpora and indexes load behind /readyz
+    warmup.task = asyncio.create_task(warm_up())
+
+async def warm_up():
+    """Connect Redis, load the corpora and build their indexes in the background"""
+    await asyncio.gather(connect_redis(), load_corpora(), warm_models())
+    summary = warmup.summary()
+    logger.info(f"Warm-up finished ({summary['status']}) after {summary['uptime_seconds']}s")
+
+async def connect_redis():
+    with warmup.phase("redis"):
+        for attempt in range(30):
+            try:
+                await redis_client.ping()
+                break
+            except Exception:
+                if attempt == 29:
+                    raise
+                await asyncio.sleep(1.0)  # Redis may still be starting
         
-        # Load dialogue database
-        await dialogue_db.load_dialogues()
+        # Convert JSON-string conversation keys and profiles from older releases
+        await migrate_conversation_keys()
+        await migrate_profile_keys()
+
+async def warm_models():
+    """Load the chat and embedding models and evaluate the persona prefix once"""
+    with warmup.phase("models") as phase:
+        async with ollama_scheduler.slot(BACKGROUND, timeout=None):
+            response = await ollama_client.post(
+                f"{OLLAMA_BASE_URL}/api/chat",
+                json={
+                    "model": OLLAMA_MODEL,
+                    "messages": [{"role": "system", "content": BMO_PERSONA}],
+                    "stream": False,
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                    "options": {"num_predict": 1}
+                },
+                timeout=300.0  # first load of the model from disk
+            )
+        response.raise_for_status()
+        result = response.json()
+        phase.update(
+            chat_load_ms=result.get("load_duration", 0) / 1e6,
+            persona_prompt_eval_ms=result.get("prompt_eval_duration", 0) / 1e6
+        )
         
-        # Load proverbs database
-        await proverb_db.load_proverbs()
-        logger.info("Startup complete: Redis connected, dialogues and proverbs loaded")
-    except Exception as e:
-        logger.error(f"Startup error: {e}")
+        if EMBEDDING_BACKEND != "local":
+            await request_embeddings(["BMO"], priority=BACKGROUND)
+
+async def load_corpora():
+    # Prefer the prebuilt offline snapshot (python dataset_snapshot.py) over HuggingFace
+    snapshot = DatasetSnapshot.open(DATASET_SNAPSHOT)
+    
+    # Load dialogue database
+    with warmup.phase("dialogues") as phase:
+        await dialogue_db.load_dialogues(snapshot)
+        phase.update(source=dialogue_db.source, rows=len(dialogue_db.dialogues), indexed=len(dialogue_db.index))
+    
+    # Load proverbs database
+    with warmup.phase("proverbs") as phase:
+        await proverb_db.load_proverbs(snapshot)
+        phase.update(source=proverb_db.source, rows=len(proverb_db.proverbs))
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if warmup.task is not None and not warmup.task.done():
+        warmup.task.cancel()
+    await session_writer.flush()
+    await profile_cache.stop()
     if redis_client:
         await redis_client.close()
     await ollama_client.aclose()
+    embedding_cache.close()
+
+def default_profile() -> Dict:
+    return {
+        "name": "Friend",
+        "language_preference": "ar",
+        "preferences": {},
+        "interaction_count": 0,
+        "favorite_topics": []
+    }
+
+PROFILE_TTL = 3600 * 24 * 30  # 30 days
+CONVERSATION_MAX_MESSAGES = 20  # Keep last 20 for efficiency
+CONVERSATION_TTL = 3600 * 24 * 7  # 7 days
+CONVERSATION_MIGRATION_KEY = "migrations:conversation_lists"
+PROFILE_MIGRATION_KEY = "migrations:profile_hashes"
+# All the prompt (and response-cache context) reads from the profile
+PROMPT_PROFILE_FIELDS = ("name", "interaction_count")
+
+# Profiles are Redis hashes. Hot ones are served from memory; field changes
+# reach Redis every PROFILE_FLUSH_INTERVAL seconds and other replicas are
+# told to re-read
+profile_cache = ProfileCache(
+    default_profile,
+    capacity=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+    flush_interval=float(os.getenv("PROFILE_FLUSH_INTERVAL", "1.0")),
+    max_age=float(os.getenv("PROFILE_CACHE_MAX_AGE", "300")),
+    ttl=PROFILE_TTL,
+    migrate=lambda session_id: migrate_profile_key(f"user_profile:{session_id}")
+)
+
+# Emotion events live in a capped stream with rolling counters, not in the profile
+emotion_history = EmotionHistory(
+    [emotion.value for emotion in EmotionType],
+    maxlen=int(os.getenv("EMOTION_HISTORY_MAXLEN", "200")),
+    ttl=PROFILE_TTL
+)
+
+def is_wrong_type(error: Exception) -> bool:
+    return isinstance(error, ResponseError) and "WRONGTYPE" in str(error)
 
 async def get_user_profile(session_id: str) -> Dict:
     """Get comprehensive user profile"""
     try:
-        profile_key = f"user_profile:{session_id}"
-        profile_json = await redis_client.get(profile_key)
+        await session_writer.wait_for(session_id)
+        profile = profile_cache.get(session_id)
+        if profile is not None:
+            return profile
         
-        if profile_json:
-            return json.loads(profile_json)
+        epoch = profile_cache.epoch
+        profile_key = f"user_profile:{session_id}"
+        try:
+            stored = await redis_client.hgetall(profile_key)
+        except ResponseError as e:
+            if not is_wrong_type(e):
+                raise
+            # Legacy JSON profile written before the migration ran
+            await migrate_profile_key(profile_key)
+            stored = await redis_client.hgetall(profile_key)
         
-        return {
-            "name": "Friend",
-            "language_preference": "ar",
-            "preferences": {},
-            "interaction_count": 0,
-            "favorite_topics": [],
-            "emotion_history": []
-        }
+        return profile_cache.fill(session_id, stored, epoch, complete=True)
     except Exception as e:
         logger.error(f"Error getting user profile: {e}")
         return {}
 
-async def save_user_profile(session_id: str, profile: Dict):
-    """Save user profile to Redis"""
+async def migrate_conversation_key(history_key: str):
+    """Rewrite one legacy JSON-string history key as a Redis list, keeping its TTL"""
+    async with redis_client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(history_key)
+            if await pipe.type(history_key) != "string":
+                return
+            history_json = await pipe.get(history_key)
+            ttl = await pipe.ttl(history_key)
+            messages = json.loads(history_json)[-CONVERSATION_MAX_MESSAGES:]
+            
+            pipe.multi()
+            pipe.delete(history_key)
+            if messages:
+                pipe.rpush(history_key, *[json.dumps(msg) for msg in messages])
+                pipe.expire(history_key, ttl if ttl > 0 else CONVERSATION_TTL)
+            await pipe.execute()
+        except WatchError:
+            pass  # another replica migrated or appended to it first
+
+async def migrate_conversation_keys():
+    """One-time scan converting every legacy conversation key"""
     try:
-        profile_key = f"user_profile:{session_id}"
-        await redis_client.setex(
-            profile_key,
-            3600 * 24 * 30,  # 30 days
-            json.dumps(profile)
-        )
+        if await redis_client.get(CONVERSATION_MIGRATION_KEY):
+            return
+        
+        migrated = 0
+        async for history_key in redis_client.scan_iter(match="conversation:*", count=500):
+            if await redis_client.type(history_key) == "string":
+                await migrate_conversation_key(history_key)
+                migrated += 1
+        
+        await redis_client.set(CONVERSATION_MIGRATION_KEY, datetime.now().isoformat())
+        logger.info(f"Migrated {migrated} conversation histories to Redis lists")
     except Exception as e:
-        logger.error(f"Error saving user profile: {e}")
+        logger.error(f"Error migrating conversation histories: {e}")
+
+async def migrate_profile_key(profile_key: str):
+    """Rewrite one legacy JSON-string profile as a hash, keeping its TTL
+    
+    An inline `emotion_history` list from older releases moves to the
+    emotion stream in the same transaction.
+    """
+    session_id = profile_key[len("user_profile:"):]
+    async with redis_client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(profile_key)
+            if await pipe.type(profile_key) != "string":
+                return
+            profile_json = await pipe.get(profile_key)
+            ttl = await pipe.ttl(profile_key)
+            profile = json.loads(profile_json)
+            legacy_emotions = profile.pop("emotion_history", None)
+            
+            pipe.multi()
+            pipe.delete(profile_key)
+            if profile:
+                pipe.hset(profile_key, mapping=encode_profile(profile))
+                pipe.expire(profile_key, ttl if ttl > 0 else PROFILE_TTL)
+            if isinstance(legacy_emotions, list):
+                emotion_history.add_legacy(pipe, session_id, legacy_emotions)
+            await pipe.execute()
+        except WatchError:
+            pass  # another replica migrated it first
 
-async def get_conversation_history(session_id: str, limit: int = 10) -> List[Dict]:
-    """Get conversation history"""
+async def migrate_profile_keys():
+    """One-time scan converting every legacy JSON profile"""
     try:
-        history_key = f"conversation:{session_id}"
-        history_json = await redis_client.get(history_key)
+        if await redis_client.get(PROFILE_MIGRATION_KEY):
+            return
         
-        if history_json:
-            return json.loads(history_json)[-limit:]
+        migrated = 0
+        async for profile_key in redis_client.scan_iter(match="user_profile:*", count=500):
+            if await redis_client.type(profile_key) == "string":
+                await migrate_profile_key(profile_key)
+                migrated += 1
         
-        return []
+        await redis_client.set(PROFILE_MIGRATION_KEY, datetime.now().isoformat())
+        logger.info(f"Migrated {migrated} user profiles to Redis hashes")
     except Exception as e:
-        logger.error(f"Error getting conversation history: {e}")
-        return []
+        logger.error(f"Error migrating user profiles: {e}")
 
-async def save_conversation(session_id: str, messages: List[Dict]):
-    """Save conversation history"""
+async def load_session(session_id: str, history_limit: int = 10) -> Tuple[Dict, List[Dict]]:
+    """Read the prompt's profile fields and the last `history_limit` messages in one round trip
+    
+    Profile fields held by the profile cache are not read from Redis at all.
+    """
+    profile_key = f"user_profile:{session_id}"
+    history_key = f"conversation:{session_id}"
     try:
-        history_key = f"conversation:{session_id}"
-        messages = messages[-20:]  # Keep last 20 for efficiency
+        await session_writer.wait_for(session_id)
+        cached_profile = profile_cache.get(session_id, PROMPT_PROFILE_FIELDS)
+        epoch = profile_cache.epoch
         
-        await redis_client.setex(
-            history_key,
-            3600 * 24 * 7,  # 7 days
-            json.dumps(messages)
-        )
+        pipe = redis_client.pipeline(transaction=False)
+        if cached_profile is None:
+            pipe.hmget(profile_key, PROMPT_PROFILE_FIELDS)
+        pipe.lrange(history_key, -history_limit, -1)
+        results = await pipe.execute(raise_on_error=False)
+        stored, entries = (None, *results) if cached_profile is not None else results
+        
+        if is_wrong_type(entries):
+            # Legacy JSON-string history written before the migration ran
+            await migrate_conversation_key(history_key)
+            entries = await redis_client.lrange(history_key, -history_limit, -1)
+        if is_wrong_type(stored):
+            # Legacy JSON profile written before the migration ran
+            await migrate_profile_key(profile_key)
+            stored = await redis_client.hmget(profile_key, PROMPT_PROFILE_FIELDS)
+        if isinstance(stored, Exception):
+            raise stored
+        if isinstance(entries, Exception):
+            raise entries
+        
+        if cached_profile is not None:
+            profile = cached_profile
+        else:
+            profile = profile_cache.fill(session_id, dict(zip(PROMPT_PROFILE_FIELDS, stored)), epoch)
+        return profile, [json.loads(entry) for entry in entries]
+    except Exception as e:
+        logger.error(f"Error loading session: {e}")
+        return {}, []
+
+async def save_session(session_id: str, messages: List[Dict],
+                       emotion: Optional[Tuple[str, float]] = None):
+    """Append this turn's messages and record its emotion in one MULTI pipeline
+    
+    The interaction count is bumped through the profile cache (HINCRBY on
+    write-back), so concurrent turns never overwrite each other's count.
+    """
+    history_key = f"conversation:{session_id}"
+    entries = [json.dumps(msg) for msg in messages]
+    
+    def queue_history(pipe):
+        if entries:
+            pipe.rpush(history_key, *entries)
+            pipe.ltrim(history_key, -CONVERSATION_MAX_MESSAGES, -1)
+            pipe.expire(history_key, CONVERSATION_TTL)
+    
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        queue_history(pipe)
+        if emotion is not None:
+            emotion_history.add(pipe, session_id, *emotion)
+        try:
+            await pipe.execute()
+        except ResponseError as e:
+            if not is_wrong_type(e):
+                raise
+            # Legacy JSON-string history written before the migration ran;
+            # everything else in the transaction was applied
+            await migrate_conversation_key(history_key)
+            pipe = redis_client.pipeline(transaction=True)
+            queue_history(pipe)
+            await pipe.execute()
+        profile_cache.update(session_id, increments={"interaction_count": 1})
     except Exception as e:
-        logger.error(f"Error saving conversation: {e}")
+        logger.error(f"Error saving session: {e}")
+
+class SessionWriter:
+    """Background session write-backs, kept in order per session
+    
+    Writes run off the response path; reads of the same session wait for
+    the pending write first, and shutdown flushes everything still queued.
+    """
+    def __init__(self):
+        self.pending: Dict[str, asyncio.Task] = {}
+    
+    def schedule(self, session_id: str, write):
+        previous = self.pending.get(session_id)
+        task = asyncio.create_task(self._run(write, previous))
+        self.pending[session_id] = task
+        task.add_done_callback(lambda done: self._forget(session_id, done))
+    
+    async def _run(self, write, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await write
+        except Exception as e:
+            logger.error(f"Background session write failed: {e}")
+    
+    def _forget(self, session_id: str, task: asyncio.Task):
+        if self.pending.get(session_id) is task:
+            del self.pending[session_id]
+    
+    async def wait_for(self, session_id: str):
+        task = self.pending.get(session_id)
+        if task is not None:
+            await asyncio.wait([task])
+    
+    async def flush(self):
+        if self.pending:
+            await asyncio.wait(list(self.pending.values()))
+
+session_writer = SessionWriter()
 
 # ==========================================
 # MAIN CHAT ENDPOINT
 # ==========================================
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Enhanced chat endpoint with advanced features"""
-    try:
-        session_id = request.session_id
-        
-        # Get user profile and conversation history
-        user_profile = await get_user_profile(session_id)
-        conversation_history = await get_conversation_history(session_id)
-        
-        # Update interaction count
-        user_profile["interaction_count"] = user_profile.get("interaction_count", 0) + 1
-        
-        # Detect emotion and intent
-        detected_emotion, emotion_confidence = await detect_emotion(request.message)
-        intent, intent_confidence = await detect_intent(request.message)
-        
-        # Track emotion history
-        if "emotion_history" not in user_profile:
-            user_profile["emotion_history"] = []
-        
-        user_profile["emotion_history"].append({
-            "emotion": detected_emotion,
-            "confidence": emotion_confidence,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Find similar dialogue examples for context
-        similar_dialogues = await dialogue_db.find_similar_dialogue(
-            request.message,
-            top_k=2
-        )
-        
-        # Get related proverb for cultural enrichment
-        related_proverb = await proverb_db.find_related_proverb(request.message)
-        emotion_proverb = proverb_db.get_proverb_for_emotion(detected_emotion)
-        
-        # Build enhanced system prompt
-        system_prompt = f"""You are BMO, a living video game console from Adventure Time, speaking Tunisian Arabic.
+# Per-stage deadlines (seconds) inside /chat: past them a retrieval stage is
+# dropped from the prompt instead of delaying the LLM call
+QUERY_EMBEDDING_TIMEOUT = float(os.getenv("QUERY_EMBEDDING_TIMEOUT", "2.0"))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "0.5"))
+RESPONSE_CACHE_TIMEOUT = float(os.getenv("RESPONSE_CACHE_TIMEOUT", "0.5"))
+stage_timeouts = Counter(
+    "bmo_chat_stage_timeouts_total", "Chat stages dropped after missing their deadline", ("stage",)
+)
+
+# Static part of the system prompt. Keep it free of per-request values: it is
+# the shared prefix Ollama can reuse from its KV cache across requests.
+BMO_PERSONA = """You are BMO, a living video game console from Adventure Time, speaking Tunisian Arabic.
 
 PERSONALITY:
 - Childlike, sweet, enthusiastic, and helpful
@@ -623,19 +1396,6 @@ LANGUAGE:
 - Respond primarily in Tunisian Darija (Arabic script + French words naturally)
 - Use these expressions: برشا (a lot), ياسر (very), توا (now), مليح (good), تمام (okay)
 
-USER CONTEXT:
-- Name: {user_profile.get('name', 'Friend')}
-- Interactions: {user_profile.get('interaction_count', 0)}
-- Current emotion detected: {detected_emotion}
-- User intent: {intent}
-
-DIALOGUE EXAMPLES (similar to current topic):
-{json.dumps(similar_dialogues[:2], ensure_ascii=False, indent=2)}
-
-TUNISIAN CULTURAL WISDOM (use if relevant):
-- Proverb: {related_proverb.get('text', 'N/A') if related_proverb else 'N/A'}
-- Emotion wisdom: {emotion_proverb.get('text', 'N/A') if emotion_proverb else 'N/A'}
-
 RESPOND:
 - Acknowledge the emotion appropriately
 - Incorporate cultural wisdom from proverbs when relevant
@@ -644,6 +1404,92 @@ RESPOND:
 - Stay in character as BMO
 - Match their emotion tone
 - Sound like authentic Tunisian Arabic speaker"""
+
+async def run_stage(stage: str, awaitable, timeout: Optional[float] = None, default=None,
+                    dropped: Optional[List[str]] = None):
+    """Time one chat stage; past `timeout` seconds it is cancelled and `default` stands in"""
+    with stage_timings.time(stage):
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Chat stage {stage} timed out after {timeout}s, answering without it")
+            stage_timeouts.labels(stage=stage).inc()
+            if dropped is not None:
+                dropped.append(stage)
+            return default
+
+async def retrieve_context(message: str, embedding_task: Optional[asyncio.Task], emotion: EmotionType,
+                           dropped: List[str]) -> Tuple[List[Dict], Optional[Dict], Optional[Dict]]:
+    """Similar dialogues, related proverb and emotion proverb, each stage bounded by its timeout"""
+    # Category index lookup: needs the emotion only
+    emotion_proverb = proverb_db.get_proverb_for_emotion(emotion)
+    query_embedding = await embedding_task if embedding_task is not None else None
+    
+    proverb_search = proverb_db.find_related_proverb(
+        message,
+        query_embedding=query_embedding,
+        emotion=emotion
+    )
+    
+    # Without the query embedding there is nothing to search dialogues with;
+    # the proverb lookup falls back to theme keywords
+    if query_embedding is None:
+        related_proverb = await run_stage("proverb_lookup", proverb_search, RETRIEVAL_TIMEOUT, None, dropped)
+        return [], related_proverb, emotion_proverb
+    
+    similar_dialogues, related_proverb = await asyncio.gather(
+        run_stage("dialogue_retrieval", dialogue_db.find_similar_dialogue(
+            message,
+            top_k=2,
+            query_embedding=query_embedding
+        ), RETRIEVAL_TIMEOUT, [], dropped),
+        run_stage("proverb_lookup", proverb_search, RETRIEVAL_TIMEOUT, None, dropped)
+    )
+    return similar_dialogues, related_proverb, emotion_proverb
+
+async def prepare_chat(request: ChatRequest) -> Dict:
+    """Gather user context, retrieval results and the Ollama request for one chat turn
+    
+    Stages run as a small dependency graph: the session read, the query
+    embedding and the message scan start together; retrieval starts as soon
+    as the embedding and detected emotion are known, alongside the response
+    cache lookup. A retrieval stage that misses its timeout is left out of
+    the prompt rather than holding up the LLM call.
+    """
+    session_id = request.session_id
+    retrieval_ready = warmup.retrieval_ready
+    dropped: List[str] = []
+    tasks: List[asyncio.Task] = []
+    
+    def start(awaitable) -> asyncio.Task:
+        task = asyncio.ensure_future(awaitable)
+        tasks.append(task)
+        return task
+    
+    try:
+        # Get user profile and conversation history (one round trip)
+        session_task = start(run_stage("session_load", load_session(session_id)))
+        
+        # The same query embedding serves the cache, dialogue and proverb retrieval
+        embedding_task = start(run_stage(
+            "query_embedding", get_embedding(request.message), QUERY_EMBEDDING_TIMEOUT, None, dropped
+        )) if response_cache.enabled or retrieval_ready else None
+        
+        # Detect emotion and intent (one scan of the message) while those are in flight
+        with stage_timings.time("analysis"):
+            detected_emotion, emotion_confidence, intent, intent_confidence = await analyze_text(request.message)
+        
+        # While corpora and indexes are still loading, answer without retrieval context
+        if retrieval_ready:
+            retrieval_task = start(retrieve_context(request.message, embedding_task, detected_emotion, dropped))
+        else:
+            logger.info("Warm-up in progress, answering without retrieval context")
+            retrieval_task = None
+        
+        user_profile, conversation_history = await session_task
+        
+        # This turn counts as an interaction (persisted by save_session)
+        user_profile["interaction_count"] = user_profile.get("interaction_count", 0) + 1
         
         # Build messages for Ollama
         messages = []
@@ -662,52 +1508,266 @@ RESPOND:
             "content": request.message
         })
         
-        # Call Ollama
-        ollama_request = {
-            "model": OLLAMA_MODEL,
+        # Opt-in response cache: same (or near-identical) message in the same context
+        cache_context = response_cache.context_key(intent, detected_emotion, user_profile.get("name", "Friend"))
+        query_embedding = None
+        if response_cache.enabled:
+            query_embedding = await embedding_task
+        cached = await run_stage(
+            "response_cache",
+            response_cache.lookup(request.message, cache_context, query_embedding),
+            RESPONSE_CACHE_TIMEOUT
+        )
+        
+        context = {
+            "session_id": session_id,
+            "message": request.message,
             "messages": messages,
-            "system": system_prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "num_predict": 250
-            }
+            "ollama_request": None,
+            "detected_emotion": detected_emotion,
+            "emotion_confidence": emotion_confidence,
+            "emotion_event": (detected_emotion, emotion_confidence),
+            "warming_up": not retrieval_ready,
+            "dropped_stages": dropped,
+            "cache_context": cache_context,
+            "query_embedding": query_embedding,
+            "cached": cached
         }
+        if cached:
+            return context
         
-        response = await ollama_client.post(
-            f"{OLLAMA_BASE_URL}/api/chat",
-            json=ollama_request
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        assistant_response = result.get("message", {}).get("content", "")
+        if retrieval_task is not None:
+            similar_dialogues, related_proverb, emotion_proverb = await retrieval_task
+            if query_embedding is None and embedding_task is not None:
+                context["query_embedding"] = await embedding_task
+        else:
+            similar_dialogues, related_proverb, emotion_proverb = [], None, None
         
-        # Save conversation
-        messages.append({
-            "role": "assistant",
-            "content": assistant_response
-        })
+        # Persona first (byte-identical every turn, so Ollama reuses its evaluated
+        # prefix), then this turn's context
+        with stage_timings.time("prompt_build"):
+            context["ollama_request"] = build_ollama_request(
+                user_profile, detected_emotion, intent, similar_dialogues, related_proverb, emotion_proverb, messages
+            )
         
-        await save_conversation(session_id, messages)
+        return context
+    finally:
+        # A cache hit (or an error) leaves retrieval unfinished
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+def build_ollama_request(user_profile: Dict, detected_emotion: EmotionType, intent: str,
+                         similar_dialogues: List[Dict], related_proverb: Optional[Dict],
+                         emotion_proverb: Optional[Dict], messages: List[Dict]) -> Dict:
+    system_prompt = BMO_PERSONA + f"""
+
+USER CONTEXT:
+- Name: {user_profile.get('name', 'Friend')}
+- Interactions: {user_profile.get('interaction_count', 0)}
+- Current emotion detected: {detected_emotion}
+- User intent: {intent}
+
+DIALOGUE EXAMPLES (similar to current topic):
+{json.dumps(similar_dialogues[:2], ensure_ascii=False, indent=2)}
+
+TUNISIAN CULTURAL WISDOM (use if relevant):
+- Proverb: {related_proverb.get('text', 'N/A') if related_proverb else 'N/A'}
+- Emotion wisdom: {emotion_proverb.get('text', 'N/A') if emotion_proverb else 'N/A'}"""
+    
+    return {
+        "model": OLLAMA_MODEL,
+        "messages": [{"role": "system", "content": system_prompt}] + messages,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "num_predict": 250
+        }
+    }
+
+def finish_chat(context: Dict, assistant_response: str):
+    """Queue the conversation, profile and response-cache write-back off the response path"""
+    session_writer.schedule(context["session_id"], persist_turn(context, assistant_response))
+
+async def persist_turn(context: Dict, assistant_response: str):
+    with stage_timings.time("session_save"):
+        # Only this turn is appended; earlier messages are already stored
+        await save_session(context["session_id"], [
+            context["messages"][-1],
+            {"role": "assistant", "content": assistant_response}
+        ], context["emotion_event"])
+    
+    # Replies generated without (full) retrieval context are not worth reusing
+    if not context["cached"] and not context["warming_up"] and not context["dropped_stages"]:
+        await response_cache.store(
+            context["message"],
+            context["cache_context"],
+            assistant_response,
+            context["query_embedding"]
+        )
+
+def overloaded_error(error: SchedulerOverloaded) -> HTTPException:
+    logger.warning(f"Rejecting chat: {error}")
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": error.retry_after_header}
+    )
+
+async def generate_chat(ollama_request: Dict, priority: int) -> Dict:
+    """One non-streaming /api/chat call through the scheduler"""
+    async with ollama_scheduler.slot(priority):
+        with stage_timings.time("llm"):
+            response = await ollama_client.post(
+                f"{OLLAMA_BASE_URL}/api/chat",
+                json=ollama_request
+            )
+    response.raise_for_status()
+    
+    result = response.json()
+    ollama_stats.record(result)
+    return result
+
+async def generate_turn(context: Dict, priority: int) -> str:
+    """Generate the reply to a prepared chat turn and queue the turn's write-back"""
+    result = await generate_chat(context["ollama_request"], priority)
+    assistant_response = result.get("message", {}).get("content", "")
+    finish_chat(context, assistant_response)
+    return assistant_response
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, priority: Optional[str] = Header(None, alias="X-Request-Priority")):
+    """Enhanced chat endpoint with advanced features
+    
+    `X-Request-Priority` (interactive, standard or background; default
+    interactive) sets the request's place in the Ollama queue.
+    """
+    try:
+        context = await prepare_chat(request)
         
-        # Update and save user profile
-        await save_user_profile(session_id, user_profile)
+        if context["cached"]:
+            assistant_response = context["cached"]["response"]
+            finish_chat(context, assistant_response)
+        else:
+            # Call Ollama; a retry of the same turn (same session, history and
+            # message) joins the call already running, and the turn is saved
+            # once, by that call. The retrieved context is left out of the key:
+            # its proverbs are picked at random.
+            assistant_response = await chat_flights.do(
+                fingerprint(OLLAMA_MODEL, context["session_id"], context["messages"]),
+                lambda: generate_turn(context, PRIORITIES.get(priority, INTERACTIVE))
+            )
         
         return ChatResponse(
             response=assistant_response,
-            session_id=session_id,
+            session_id=context["session_id"],
             timestamp=datetime.now().isoformat(),
-            detected_emotion=detected_emotion,
-            confidence=emotion_confidence,
-            learned_something=False
+            detected_emotion=context["detected_emotion"],
+            confidence=context["emotion_confidence"],
+            learned_something=False,
+            from_cache=bool(context["cached"]),
+            warming_up=context["warming_up"]
         )
         
+    except SchedulerOverloaded as e:
+        raise overloaded_error(e)
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, priority: Optional[str] = Header(None, alias="X-Request-Priority")):
+    """Stream the reply as Server-Sent Events while Ollama generates it
+    
+    Emits `token` events ({"content": ...}) as chunks arrive and a final
+    `done` event carrying the full response, detected_emotion, confidence
+    and time_to_first_token_ms. History and profile are saved after the
+    stream completes.
+    """
+    started = time.perf_counter()
+    try:
+        context = await prepare_chat(request)
+        # Take the Ollama slot before answering, so an overload is a plain 503
+        slot = {} if context["cached"] else {
+            "started": await ollama_scheduler.acquire(PRIORITIES.get(priority, INTERACTIVE))
+        }
+    except SchedulerOverloaded as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    def release_slot():
+        if slot:
+            ollama_scheduler.release(slot.pop("started"))
+    
+    async def event_stream():
+        chunks = []
+        first_token_ms = None
+        
+        try:
+            if context["cached"]:
+                first_token_ms = (time.perf_counter() - started) * 1000
+                chunks.append(context["cached"]["response"])
+                yield sse_event("token", {"content": context["cached"]["response"]})
+            else:
+                ollama_request = dict(context["ollama_request"], stream=True)
+                async with ollama_client.stream(
+                    "POST",
+                    f"{OLLAMA_BASE_URL}/api/chat",
+                    json=ollama_request
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        content = chunk.get("message", {}).get("content", "")
+                        if content:
+                            if first_token_ms is None:
+                                first_token_ms = (time.perf_counter() - started) * 1000
+                                stream_stats.record_first_token(first_token_ms)
+                            chunks.append(content)
+                            yield sse_event("token", {"content": content})
+                        if chunk.get("done"):
+                            ollama_stats.record(chunk)
+                            break
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}")
+            stream_stats.errors += 1
+            yield sse_event("error", {"detail": str(e)})
+            return
+        finally:
+            release_slot()
+        
+        assistant_response = "".join(chunks)
+        yield sse_event("done", {
+            "response": assistant_response,
+            "session_id": context["session_id"],
+            "timestamp": datetime.now().isoformat(),
+            "detected_emotion": context["detected_emotion"],
+            "confidence": context["emotion_confidence"],
+            "time_to_first_token_ms": first_token_ms,
+            "total_ms": (time.perf_counter() - started) * 1000,
+            "from_cache": bool(context["cached"]),
+            "warming_up": context["warming_up"]
+        })
+        
+        finish_chat(context, assistant_response)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release_slot)  # client gone before the stream started
+    )
+
 # ==========================================
 # ADDITIONAL ENDPOINTS
 # ==========================================
@@ -737,11 +1797,165 @@ async def recognize_intent(text: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==========================================
+# BATCH ANALYSIS
+# ==========================================
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+BATCH_FLUSH_ROWS = 256  # result rows per streamed write
+BATCH_QUEUE_ITEMS = 1024  # parsed NDJSON items buffered ahead of scoring
+
+class BatchResponse(StreamingResponse):
+    """NDJSON results streamed while the request body is still being read
+    
+    Starlette watches for client disconnects by reading `receive()` while
+    the response streams and drops any body chunks it picks up, so the body
+    must have a single reader: `reader` reads it into a queue, and
+    disconnect listening starts only once it is done.
+    """
+    def __init__(self, content, reader: Optional[asyncio.Task] = None):
+        super().__init__(content, media_type=NDJSON_MEDIA_TYPE)
+        self.reader = reader
+    
+    async def listen_for_disconnect(self, receive):
+        if self.reader is not None:
+            await asyncio.wait([self.reader])
+        await super().listen_for_disconnect(receive)
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.reader is not None:
+                self.reader.cancel()
+
+async def open_batch(request: Request) -> Tuple[AsyncIterator[Tuple[int, object]], Optional[asyncio.Task]]:
+    """Start reading a batch body: a JSON array, or NDJSON (one item per line)
+    
+    A JSON array is parsed whole and rejected with 400 if invalid. NDJSON is
+    parsed line by line as the body arrives, by a reader task feeding a
+    bounded queue, so memory stays flat; a line that is not valid JSON comes
+    through as its ValueError. Returns the items and the reader task, if any.
+    """
+    stream = request.stream()
+    head = b""
+    async for chunk in stream:
+        head += chunk
+        if head.strip():
+            break
+    
+    if not head.lstrip().startswith(b"["):
+        queue = asyncio.Queue(maxsize=BATCH_QUEUE_ITEMS)
+        reader = asyncio.create_task(feed_queue(iter_ndjson(head, stream), queue))
+        return iter_queue(queue), reader
+    
+    async for chunk in stream:
+        head += chunk
+    try:
+        items = json.loads(head)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON array: {e}")
+    return iter_array(items), None
+
+async def feed_queue(items: AsyncIterator[Tuple[int, object]], queue: asyncio.Queue):
+    """Move parsed items into `queue`, then a None end marker"""
+    try:
+        async for entry in items:
+            await queue.put(entry)
+    except ClientDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error reading batch body: {e}")
+    await queue.put(None)
+
+async def iter_queue(queue: asyncio.Queue) -> AsyncIterator[Tuple[int, object]]:
+    while (entry := await queue.get()) is not None:
+        yield entry
+
+async def iter_array(items: List) -> AsyncIterator[Tuple[int, object]]:
+    for index, item in enumerate(items):
+        yield index, item
+
+async def iter_ndjson(head: bytes, stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    index = 0
+    pending = head
+    while True:
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield index, json.loads(line)
+                except ValueError as e:
+                    yield index, e
+                index += 1
+        try:
+            pending += await stream.__anext__()
+        except StopAsyncIteration:
+            break
+    if pending.strip():
+        try:
+            yield index, json.loads(pending)
+        except ValueError as e:
+            yield index, e
+
+async def stream_batch(items: AsyncIterator[Tuple[int, object]], score: Callable[[str], Dict]) -> AsyncIterator[bytes]:
+    """Score each item and stream the results back as NDJSON, in input order"""
+    rows = []
+    async for index, item in items:
+        row = {"index": index}
+        if isinstance(item, dict) and "id" in item:
+            row["id"] = item["id"]
+        text = item.get("text") if isinstance(item, dict) else item
+        if isinstance(item, ValueError):
+            row["error"] = f"Invalid JSON: {item}"
+        elif not isinstance(text, str):
+            row["error"] = 'Expected a string or an object with a "text" string'
+        else:
+            row.update(score(text))
+        rows.append(json.dumps(row, ensure_ascii=False))
+        
+        if len(rows) >= BATCH_FLUSH_ROWS:
+            yield ("\n".join(rows) + "\n").encode("utf-8")
+            rows = []
+    if rows:
+        yield ("\n".join(rows) + "\n").encode("utf-8")
+
+def emotion_row(text: str) -> Dict:
+    emotion_scores, _ = score_text(text)
+    emotion, confidence = best_emotion(emotion_scores)
+    return {"emotion": emotion.value, "confidence": confidence}
+
+def intent_row(text: str) -> Dict:
+    _, intent_scores = score_text(text)
+    intent, confidence = best_intent(intent_scores)
+    return {"intent": intent, "confidence": confidence}
+
+@app.post("/emotion-analysis/batch")
+async def analyze_emotion_batch(request: Request):
+    """Analyze the emotion of many texts, streaming NDJSON results
+    
+    The body is a JSON array or NDJSON; each item is a string or an object
+    with `text` (and an optional `id`, echoed back). Each result line has
+    the item's `index` and either `emotion` and `confidence` or `error`.
+    """
+    items, reader = await open_batch(request)
+    return BatchResponse(stream_batch(items, emotion_row), reader)
+
+@app.post("/intent-recognition/batch")
+async def recognize_intent_batch(request: Request):
+    """Recognize the intent of many texts, streaming NDJSON results
+    
+    Same body and result format as /emotion-analysis/batch, with `intent`
+    in place of `emotion`.
+    """
+    items, reader = await open_batch(request)
+    return BatchResponse(stream_batch(items, intent_row), reader)
+
 @app.get("/user-profile/{session_id}")
 async def get_profile(session_id: str):
     """Get user profile"""
     try:
         profile = await get_user_profile(session_id)
+        profile["emotion_stats"] = await emotion_history.summary(session_id)
         return profile
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -750,9 +1964,7 @@ async def get_profile(session_id: str):
 async def set_user(session_id: str, name: str):
     """Set user name"""
     try:
-        profile = await get_user_profile(session_id)
-        profile["name"] = name
-        await save_user_profile(session_id, profile)
+        profile_cache.update(session_id, {"name": name})  # HSET of this one field on write-back
         
         return {
             "status": "success",
@@ -761,54 +1973,103 @@ async def set_user(session_id: str, name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/livez")
+async def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive", "service": "bmo-ai-enhanced"}
+
+@app.get("/readyz")
+async def readiness_check():
+    """Readiness: Redis reachable and corpora/indexes loaded (503 with progress until then)"""
+    summary = warmup.summary()
+    return JSONResponse(summary, status_code=200 if warmup.ready else 503)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
+        "ready": warmup.ready,
         "service": "bmo-ai-enhanced",
         "dialogues_loaded": dialogue_db.loaded,
-        "dialogue_count": len(dialogue_db.dialogues)
+        "dialogue_count": len(dialogue_db.dialogues),
+        "embedding_backend": EMBEDDING_MODEL_ID if EMBEDDING_BACKEND == "local" else "ollama",
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "single_flight": {
+            "embedding": embedding_flights.stats(),
+            "chat": chat_flights.stats()
+        },
+        "chat_stream": stream_stats.summary(),
+        "ollama": ollama_stats.summary(),
+        "ollama_scheduler": ollama_scheduler.stats(),
+        "response_cache": await response_cache.stats(),
+        "profile_cache": profile_cache.stats(),
+        "stage_latency_ms": stage_timings.summary(),
+        "pending_session_writes": len(session_writer.pending)
     }
 
-@app.get("/dialogue-stats")
-async def get_dialogue_stats():
-    """Get statistics about loaded dialogues"""
-    try:
-        intents = defaultdict(int)
-        speakers = defaultdict(int)
+class ServiceStats:
+    """Values kept by the scheduler, single-flight groups, stream stats and
+    profile cache, exported as they are at scrape time"""
+    def describe(self):
+        return []
+    
+    def collect(self):
+        yield GaugeMetricFamily("bmo_ollama_in_flight", "Ollama requests holding a slot", ollama_scheduler.in_flight)
+        yield GaugeMetricFamily("bmo_ollama_queued", "Ollama requests waiting for a slot", ollama_scheduler.waiting)
+        for outcome in ("admitted", "rejected", "expired"):
+            family = CounterMetricFamily(
+                f"bmo_ollama_requests_{outcome}", f"Ollama requests {outcome} by the scheduler", labels=("priority",)
+            )
+            for priority, count in getattr(ollama_scheduler, outcome).items():
+                family.add_metric([priority], count)
+            yield family
         
-        for dialogue in dialogue_db.dialogues:
-            intents[dialogue.get('intent', 'unknown')] += 1
-            speakers[dialogue.get('speaker', 'unknown')] += 1
+        for counter in ("calls", "collapsed"):
+            family = CounterMetricFamily(
+                f"bmo_single_flight_{counter}", f"Single-flight {counter} by call type", labels=("call",)
+            )
+            family.add_metric(["embedding"], embedding_flights.stats()[counter])
+            family.add_metric(["chat"], chat_flights.stats()[counter])
+            yield family
         
-        return {
-            "total_dialogues": len(dialogue_db.dialogues),
-            "intents": dict(intents),
-            "speakers": dict(speakers),
-            "loaded": dialogue_db.loaded
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        yield CounterMetricFamily(
+            "bmo_chat_stream_errors", "Chat streams that ended with an error event", stream_stats.errors
+        )
+        
+        cache_stats = profile_cache.stats()
+        for counter in ("hits", "misses", "profiles_written", "invalidations"):
+            yield CounterMetricFamily(
+                f"bmo_profile_cache_{counter}", f"Profile cache {counter.replace('_', ' ')}", cache_stats[counter]
+            )
+        yield GaugeMetricFamily(
+            "bmo_profile_cache_dirty", "Profiles changed in memory but not yet written to Redis", cache_stats["dirty"]
+        )
+
+REGISTRY.register(ServiceStats())
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request and chat-stage latency, Ollama timings and queueing"""
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+def stats_response(stats: CorpusStats, if_none_match: Optional[str]) -> Response:
+    """The precomputed stats body, or 304 when the client already has it"""
+    headers = {"ETag": stats.etag, "Cache-Control": "no-cache"}
+    if stats.not_modified(if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(stats.body, media_type="application/json", headers=headers)
+
+@app.get("/dialogue-stats")
+async def get_dialogue_stats(if_none_match: Optional[str] = Header(None)):
+    """Get statistics about loaded dialogues (counted once per load)"""
+    return stats_response(dialogue_db.stats, if_none_match)
 
 @app.get("/proverb-stats")
-async def get_proverb_stats():
-    """Get statistics about loaded Tunisian proverbs"""
-    try:
-        prompts = defaultdict(int)
-        
-        for proverb in proverb_db.proverbs:
-            prompt = proverb.get('prompt', 'unknown')
-            prompts[prompt] += 1
-        
-        return {
-            "total_proverbs": len(proverb_db.proverbs),
-            "categories": dict(prompts),
-            "loaded": proverb_db.loaded,
-            "image_associations": len(proverb_db.image_associations)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_proverb_stats(if_none_match: Optional[str] = Header(None)):
+    """Get statistics about loaded Tunisian proverbs (counted once per load)"""
+    return stats_response(proverb_db.stats, if_none_match)
 
 @app.get("/random-proverb")
 async def get_random_proverb():
@@ -817,7 +2078,6 @@ async def get_random_proverb():
         if not proverb_db.proverbs:
             return {"error": "No proverbs loaded"}
         
-        import random
         proverb = random.choice(proverb_db.proverbs)
         
         return {
@@ -833,24 +2093,14 @@ async def get_random_proverb():
 async def get_proverbs_by_emotion(emotion: str):
     """Get proverbs relevant to specific emotion"""
     try:
-        emotion_prompts = {
-            'happy': ['Happiness', 'Contentment', 'Friendship'],
-            'sad': ['Patience', 'Hope', 'Happiness'],
-            'angry': ['Patience', 'Peace', 'Wisdom'],
-            'confused': ['Knowledge', 'Wisdom', 'Understanding'],
-            'excited': ['Innovation', 'Hope', 'Success'],
-            'tired': ['Rest', 'Health', 'Balance'],
-            'nervous': ['Courage', 'Hope', 'Trust'],
-            'grateful': ['Gratitude', 'Contentment', 'Blessings']
-        }
-        
-        prompts = emotion_prompts.get(emotion, [])
-        matching_proverbs = [p for p in proverb_db.proverbs if p.get('prompt') in prompts]
+        proverbs, index = proverb_db.proverbs, proverb_db.index
+        positions = index.for_emotion(emotion)
+        matching_proverbs = [proverbs[position] for position in positions[:5]]
         
         return {
             "emotion": emotion,
-            "count": len(matching_proverbs),
-            "proverbs": matching_proverbs[:5],
+            "count": len(positions),
+            "proverbs": matching_proverbs,
             "total_available": len(proverb_db.proverbs)
         }
     except Exception as e:
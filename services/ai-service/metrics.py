@@ -0,0 +1,48 @@
+"""
+Request latency for /metrics, on prometheus_client's default registry.
+
+`RequestMetrics` is ASGI middleware timing every request (to the end of
+the response body) by method, route template and status. Each service is
+built from its own directory, so each carries a copy of this module.
+"""
+import time
+
+from prometheus_client import Histogram
+
+# Seconds; covers a Redis round trip up to a slow LLM generation
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def request_histogram(name: str, documentation: str) -> Histogram:
+    return Histogram(name, documentation, ("method", "route", "status"), buckets=LATENCY_BUCKETS)
+
+
+class RequestMetrics:
+    """ASGI middleware: request latency by method, route and status"""
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the shared scope; the
+            # template (not the raw path) keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.histogram.labels(method=scope["method"], route=route, status=status[0]).observe(
+                time.perf_counter() - started
+            )
@@ -0,0 +1,162 @@
+"""
+Admission control in front of the local Ollama server.
+
+At most `max_in_flight` requests hold a slot at once; the rest wait in a
+bounded priority queue (interactive before standard before background,
+FIFO within a class). A request is rejected straight away with a
+`SchedulerOverloaded` carrying a retry-after hint when the queue is full,
+or when its expected wait already exceeds its deadline, and it is removed
+from the queue if the deadline passes while it waits.
+
+Queue depth at admission and time spent waiting (by priority) are
+observed into prometheus_client histograms on the given registry.
+"""
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+from prometheus_client import REGISTRY, CollectorRegistry, Histogram
+
+INTERACTIVE = 0
+STANDARD = 1
+BACKGROUND = 2
+PRIORITIES = {"interactive": INTERACTIVE, "standard": STANDARD, "background": BACKGROUND}
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class SchedulerOverloaded(Exception):
+    """No Ollama slot within the deadline; retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class OllamaScheduler:
+    """Bounded, prioritized admission of requests to a shared Ollama server"""
+
+    def __init__(self, max_in_flight: int = 2, max_queue: int = 32, queue_timeout: Optional[float] = 10.0,
+                 registry: Optional[CollectorRegistry] = REGISTRY):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._queue: List = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._service_seconds = 1.0  # moving average of how long a slot is held
+
+        self.admitted = {name: 0 for name in PRIORITIES}
+        self.rejected = {name: 0 for name in PRIORITIES}
+        self.expired = {name: 0 for name in PRIORITIES}
+        self.wait_seconds = Histogram(
+            "bmo_ollama_queue_wait_seconds", "Time a request waited for an Ollama slot",
+            ("priority",), buckets=WAIT_BUCKETS, registry=registry
+        )
+        self.queue_depth = Histogram(
+            "bmo_ollama_queue_depth", "Requests already waiting when a request asked for an Ollama slot",
+            buckets=DEPTH_BUCKETS, registry=registry
+        )
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def expected_wait(self, priority: int) -> float:
+        """Seconds until a new request of this priority would likely get a slot"""
+        ahead = sum(1 for queued, _, future in self._queue if queued <= priority and not future.done())
+        return (ahead + 1) / self.max_in_flight * self._service_seconds
+
+    async def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = -1) -> float:
+        """Wait for a slot and return its start time; pass it back to `release`
+
+        `timeout` defaults to the scheduler's queue_timeout; None waits indefinitely.
+        """
+        name = _priority_name(priority)
+        if timeout == -1:
+            timeout = self.queue_timeout
+        self.queue_depth.observe(self.waiting)
+        requested = time.perf_counter()
+
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected[name] += 1
+                raise SchedulerOverloaded("Ollama queue is full", self.expected_wait(priority))
+            if timeout is not None and self.expected_wait(priority) > timeout:
+                self.rejected[name] += 1
+                raise SchedulerOverloaded("Ollama queue wait would exceed the deadline", self.expected_wait(priority))
+
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._sequence), future))
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                if not future.done():
+                    future.cancel()
+                    self.expired[name] += 1
+                    raise SchedulerOverloaded("Timed out waiting for Ollama", self.expected_wait(priority))
+                # The slot was handed over just as the deadline passed: keep it
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release_slot()  # slot handed over to a caller that went away
+                else:
+                    future.cancel()
+                raise
+
+        self.admitted[name] += 1
+        started = time.perf_counter()
+        self.wait_seconds.labels(priority=name).observe(started - requested)
+        return started
+
+    def release(self, started: float):
+        held = time.perf_counter() - started
+        self._service_seconds = 0.8 * self._service_seconds + 0.2 * held
+        self._release_slot()
+
+    def _release_slot(self):
+        # Hand the slot straight to the next live waiter, highest priority first
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, timeout: Optional[float] = -1):
+        started = await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def stats(self) -> Dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "avg_service_seconds": round(self._service_seconds, 3),
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+            "expired": dict(self.expired)
+        }
+
+
+def _priority_name(priority: int) -> str:
+    for name, value in PRIORITIES.items():
+        if value == priority:
+            return name
+    raise ValueError(f"Unknown priority {priority}")
@@ -0,0 +1,182 @@
+"""
+Compiled multi-pattern matcher for keyword tables.
+
+Several tables (emotion keywords, emotion regexes, intent keywords) are
+registered with tags and compiled once into a single matcher:
+- every distinct literal (keywords, plus the literals each regex requires)
+  is checked exactly once, however many tables list it; literals without
+  whitespace are checked against the message's distinct tokens only
+- a literal is skipped when a shorter literal it contains is absent
+- a regex is only tried when all the literals it requires are present, and
+  only at the positions where its leading literal occurs (`str.find` +
+  `pattern.match`), instead of a full `re.search` over the message
+
+One `scan` returns per-tag counts for every table at once, with the same
+results as testing `keyword in text` for every keyword and
+`re.search(pattern, text)` for every pattern.
+
+Substring checks run in C, which in CPython beats walking a pure-Python
+Aho-Corasick automaton or a combined lookahead regex over the text.
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, List, Tuple
+import re
+
+QUANTIFIERS = set("*?{")
+ANCHOR_PROBES = 8  # anchor occurrences tried with `match` before falling back to `search`
+
+
+def _skip_group(pattern: str, start: int, open_char: str, close_char: str) -> int:
+    """Index just past the bracket that closes the one at `start`"""
+    depth = 0
+    position = start
+    while position < len(pattern):
+        char = pattern[position]
+        if char == "\\":
+            position += 2
+            continue
+        if char == open_char:
+            depth += 1
+        elif char == close_char:
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return position
+
+
+def literal_prefix(pattern: str) -> str:
+    """Leading characters every match of `pattern` starts with"""
+    prefix = []
+    for char in pattern:
+        if char in "\\.^$*+?{}[]|()":
+            if char in QUANTIFIERS and prefix:
+                prefix.pop()  # the previous character is optional
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+
+def required_literals(pattern: str) -> List[str]:
+    """Literal runs that must appear in any text `pattern` matches (conservative)"""
+    if "|" in pattern or "(?" in pattern:
+        return []  # alternation or inline flags: no safe requirements
+
+    runs: List[str] = []
+    current: List[str] = []
+
+    def flush():
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == "\\":
+            flush()
+            position += 2
+        elif char == "[":
+            flush()
+            position = _skip_group(pattern, position, "[", "]") if "]" in pattern[position + 1:] else len(pattern)
+        elif char == "(":
+            flush()
+            position = _skip_group(pattern, position, "(", ")")
+        elif char in QUANTIFIERS:
+            if current:
+                current.pop()  # the previous character is optional
+            flush()
+            position = pattern.index("}", position) + 1 if char == "{" and "}" in pattern[position:] else position + 1
+        elif char == "+":
+            flush()
+            position += 1
+        elif char in ".^$)]}":
+            flush()
+            position += 1
+        else:
+            current.append(char)
+            position += 1
+    flush()
+    return runs
+
+
+class MultiPatternMatcher:
+    """Match many tagged keywords and regex patterns against a text in one scan"""
+
+    def __init__(self):
+        self._keyword_tags: Dict[str, Counter] = defaultdict(Counter)
+        self._pattern_tags: Dict[str, Counter] = defaultdict(Counter)
+        self._literals: List[Tuple[str, Tuple[str, ...], bool]] = []
+        self._literal_tags: Dict[str, Tuple[Tuple[Hashable, int], ...]] = {}
+        self._patterns: List[Tuple[re.Pattern, str, frozenset, Tuple[Tuple[Hashable, int], ...]]] = []
+
+    def add_keyword(self, keyword: str, tag: Hashable):
+        """Count `tag` once per registration whenever `keyword` occurs in the text"""
+        self._keyword_tags[keyword][tag] += 1
+
+    def add_pattern(self, pattern: str, tag: Hashable):
+        """Count `tag` once per registration whenever `pattern` matches somewhere in the text"""
+        self._pattern_tags[pattern][tag] += 1
+
+    def compile(self) -> "MultiPatternMatcher":
+        literals = set(self._keyword_tags)
+        self._literal_tags = {keyword: tuple(tags.items()) for keyword, tags in self._keyword_tags.items()}
+        self._patterns = []
+        for pattern, tags in self._pattern_tags.items():
+            required = frozenset(required_literals(pattern))
+            literals |= required
+            self._patterns.append((re.compile(pattern), literal_prefix(pattern), required, tuple(tags.items())))
+
+        # Shortest first, each with the shorter literals it contains: if any
+        # of those is absent from a text, this one cannot be present either
+        ordered = sorted(literals, key=len)
+        self._literals = [
+            (
+                literal,
+                tuple(other for other in ordered[:position] if other in literal),
+                not any(char.isspace() for char in literal)
+            )
+            for position, literal in enumerate(ordered)
+        ]
+        return self
+
+    def scan(self, text: str) -> Dict[Hashable, int]:
+        """Return tag -> number of registered keywords/patterns that matched"""
+        # A literal without whitespace can only occur inside one
+        # whitespace-separated token, so it is enough to search the distinct
+        # tokens once each instead of the whole (often repetitive) message
+        vocabulary = "\n".join(set(text.split()))
+
+        present = set()
+        absent = set()
+        for literal, contained, single_token in self._literals:
+            if absent.isdisjoint(contained) and literal in (vocabulary if single_token else text):
+                present.add(literal)
+            else:
+                absent.add(literal)
+
+        counts: Dict[Hashable, int] = {}
+        literal_tags = self._literal_tags
+        for literal in present:
+            for tag, weight in literal_tags.get(literal, ()):
+                counts[tag] = counts.get(tag, 0) + weight
+        for pattern, anchor, required, tags in self._patterns:
+            if required <= present and self._matches(pattern, anchor, text):
+                for tag, weight in tags:
+                    counts[tag] = counts.get(tag, 0) + weight
+        return counts
+
+    @staticmethod
+    def _matches(pattern: re.Pattern, anchor: str, text: str) -> bool:
+        """Same as `pattern.search(text)`, trying only where the leading literal occurs"""
+        if not anchor:
+            return pattern.search(text) is not None
+        position = text.find(anchor)
+        for _ in range(ANCHOR_PROBES):
+            if position == -1:
+                return False
+            if pattern.match(text, position):
+                return True
+            position = text.find(anchor, position + 1)
+        # A very common leading literal: let the regex engine scan the rest
+        return position != -1 and pattern.search(text, position) is not None
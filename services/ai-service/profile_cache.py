@@ -0,0 +1,287 @@
+"""
+User profiles as Redis hashes, with an in-process cache and write-behind.
+
+Each profile is a hash, one field per profile field: text and counters are
+stored as-is, structured values as JSON. Readers fetch only the fields they
+need (HMGET) or the whole profile (HGETALL); writers never rewrite it.
+
+Reads are served from a bounded LRU of decoded fields; a miss is filled from
+Redis by the caller. Changes are recorded per field, as new values (HSET) or
+counter deltas (HINCRBY), applied to the cached copy at once and written back
+together in one MULTI every `flush_interval` seconds and at shutdown.
+Repeated changes to a profile in that window cost a single write, and deltas
+from different replicas add up instead of overwriting each other. Changes
+not yet written back are also applied over every fresh read, so a profile
+evicted from the LRU never looks older than this replica's own changes.
+
+Every flush publishes the written session ids on a Redis channel; other
+replicas drop their cached copies of those sessions so their next read goes
+back to Redis. A replica that (re)subscribes drops everything, since it may
+have missed messages, and entries older than `max_age` are re-read
+regardless.
+
+Keys:
+    user_profile:{session_id} -> hash {name, language_preference, interaction_count, ...}
+"""
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+import asyncio
+import copy
+import json
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = {"name", "language_preference"}
+COUNTER_FIELDS = {"interaction_count"}
+
+
+def encode_field(field: str, value) -> str:
+    if field in TEXT_FIELDS or field in COUNTER_FIELDS:
+        return str(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def decode_field(field: str, raw: str):
+    if field in COUNTER_FIELDS:
+        return int(raw)
+    if field in TEXT_FIELDS:
+        return raw
+    return json.loads(raw)
+
+
+def encode_profile(profile: Dict) -> Dict[str, str]:
+    return {field: encode_field(field, value) for field, value in profile.items()}
+
+
+def _new_changes() -> Dict:
+    return {"set": {}, "incr": {}}
+
+
+def _merge(changes: Dict, values: Dict, increments: Dict):
+    """Record newer changes on top of `changes` (a set value absorbs earlier deltas)"""
+    for field, value in values.items():
+        changes["set"][field] = copy.deepcopy(value)
+        changes["incr"].pop(field, None)
+    for field, amount in increments.items():
+        if field in changes["set"]:
+            changes["set"][field] += amount
+        else:
+            changes["incr"][field] = changes["incr"].get(field, 0) + amount
+
+
+def _apply(profile: Dict, changes: Optional[Dict]):
+    """Apply recorded changes to decoded fields (deltas only to fields present)"""
+    if not changes:
+        return
+    for field, value in changes["set"].items():
+        profile[field] = copy.deepcopy(value)
+    for field, amount in changes["incr"].items():
+        if field in profile:
+            profile[field] += amount
+
+
+class ProfileCache:
+    """Bounded LRU of decoded profile fields with field-level write-behind and cross-replica invalidation"""
+
+    def __init__(self, defaults: Callable[[], Dict], capacity: int = 10000, flush_interval: float = 1.0,
+                 max_age: float = 300.0, ttl: int = 3600 * 24 * 30,
+                 key: Callable[[str], str] = lambda session_id: f"user_profile:{session_id}",
+                 channel: str = "user_profile:invalidate",
+                 migrate: Optional[Callable[[str], Awaitable]] = None):
+        self.defaults = defaults
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.ttl = ttl
+        self.key = key
+        self.channel = channel
+        self.migrate = migrate  # rewrites a legacy (non-hash) profile key, given the session id
+        self.redis = None
+        self.replica_id = uuid.uuid4().hex
+
+        # session -> {"fields": decoded fields, "complete": all fields known, "loaded": monotonic time}
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.pending: Dict[str, Dict] = {}  # session -> changes not yet written back
+        self.epoch = 0  # bumped on every invalidation and flush; fills started before one are not cached
+        self.tasks = []
+
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.written = 0
+        self.invalidations = 0
+
+    # ---- reads ----
+    def get(self, session_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """A private copy of the cached fields (all of them if `fields` is None), or None on a miss"""
+        entry = self.entries.get(session_id)
+        if entry is not None and time.monotonic() - entry["loaded"] < self.max_age:
+            cached = entry["fields"]
+            if fields is None:
+                profile = copy.deepcopy(cached) if entry["complete"] else None
+            elif all(field in cached for field in fields):
+                profile = {field: copy.deepcopy(cached[field]) for field in fields}
+            else:
+                profile = None
+            if profile is not None:
+                self.entries.move_to_end(session_id)
+                self.hits += 1
+                return profile
+
+        self.misses += 1
+        return None
+
+    def fill(self, session_id: str, stored: Dict[str, Optional[str]], epoch: int, complete: bool = False) -> Dict:
+        """Decode fields just read from Redis, apply this replica's unwritten changes and cache them
+
+        `stored` maps field names to raw hash values (None for absent fields,
+        which take their default); `complete` marks an HGETALL result.
+        """
+        defaults = self.defaults()
+        profile = {
+            field: decode_field(field, raw) if raw is not None else defaults.get(field)
+            for field, raw in stored.items()
+        }
+        if complete:
+            for field, value in defaults.items():
+                profile.setdefault(field, value)
+        _apply(profile, self.pending.get(session_id))
+
+        if epoch == self.epoch:
+            entry = self.entries.get(session_id)
+            if entry is not None and not complete:
+                entry["fields"].update(copy.deepcopy(profile))
+                entry["loaded"] = time.monotonic()
+                self.entries.move_to_end(session_id)
+            else:
+                self._store(session_id, copy.deepcopy(profile), complete)
+        return profile
+
+    def _store(self, session_id: str, fields: Dict, complete: bool):
+        self.entries[session_id] = {"fields": fields, "complete": complete, "loaded": time.monotonic()}
+        self.entries.move_to_end(session_id)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)  # its unwritten changes stay in `pending`
+
+    # ---- writes ----
+    def update(self, session_id: str, values: Optional[Dict] = None, increments: Optional[Dict[str, int]] = None):
+        """Set fields and/or add to counters; written back on the next flush"""
+        values, increments = values or {}, increments or {}
+        _merge(self.pending.setdefault(session_id, _new_changes()), values, increments)
+        entry = self.entries.get(session_id)
+        if entry is not None:
+            _apply(entry["fields"], {"set": values, "incr": increments})
+
+    def _requeue(self, session_id: str, changes: Dict):
+        """Put back changes that were not written, ahead of any recorded since"""
+        newer = self.pending.get(session_id)
+        if newer is not None:
+            _merge(changes, newer["set"], newer["incr"])
+        self.pending[session_id] = changes
+
+    def invalidate(self, session_id: str):
+        """Drop the cached copy after another replica wrote this profile"""
+        self.epoch += 1
+        self.invalidations += 1
+        self.entries.pop(session_id, None)
+
+    def invalidate_all(self):
+        self.epoch += 1
+        self.entries.clear()
+
+    # ---- write-behind ----
+    async def flush(self):
+        """Write every recorded change in one MULTI and tell the other replicas"""
+        if self.redis is None or not self.pending:
+            return
+
+        batch, self.pending = self.pending, {}
+        self.epoch += 1  # a read already in flight may predate these writes
+        pipe = self.redis.pipeline(transaction=True)
+        commands = {}
+        for session_id, changes in batch.items():
+            profile_key = self.key(session_id)
+            if changes["set"]:
+                pipe.hset(profile_key, mapping=encode_profile(changes["set"]))
+            for field, amount in changes["incr"].items():
+                pipe.hincrby(profile_key, field, amount)
+            pipe.expire(profile_key, self.ttl)
+            commands[session_id] = bool(changes["set"]) + len(changes["incr"]) + 1
+        pipe.publish(self.channel, json.dumps({"replica": self.replica_id, "sessions": list(batch)}))
+
+        try:
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            logger.error(f"Profile write-back failed, will retry: {e}")
+            for session_id, changes in batch.items():
+                self._requeue(session_id, changes)
+            return
+
+        self.flushes += 1
+        position = 0
+        for session_id, count in commands.items():
+            errors = [result for result in results[position:position + count] if isinstance(result, Exception)]
+            position += count
+            if not errors:
+                self.written += 1
+            elif self.migrate is not None and any("WRONGTYPE" in str(error) for error in errors):
+                # A legacy JSON profile: none of its commands applied, so
+                # convert it and write the same changes again next time
+                try:
+                    await self.migrate(session_id)
+                except Exception as e:
+                    logger.error(f"Error migrating profile {session_id}: {e}")
+                self._requeue(session_id, batch[session_id])
+            else:
+                logger.error(f"Profile write-back for {session_id} failed: {errors[0]}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self.invalidate_all()  # messages may have been missed while unsubscribed
+                async for message in pubsub.listen():
+                    data = json.loads(message["data"])
+                    if data.get("replica") != self.replica_id:
+                        for session_id in data.get("sessions", []):
+                            self.invalidate(session_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Profile invalidation listener error: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.reset()
+
+    def start(self, redis_client):
+        self.redis = redis_client
+        self.tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._listen())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "capacity": self.capacity,
+            "dirty": len(self.pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "flushes": self.flushes,
+            "profiles_written": self.written,
+            "invalidations": self.invalidations
+        }
@@ -0,0 +1,226 @@
+"""
+Semantic response cache for BMO chat completions, stored in Redis so every
+AI-service replica shares it.
+
+Entries are scoped by a context key (detected intent, emotion and user
+name) and looked up in two steps:
+- exact: the normalized message text within that context
+- semantic: cosine similarity between the message embedding and the
+  embeddings of recent entries in the same context, above a threshold
+
+Every entry has a TTL, and a global access-ordered sorted set bounds the
+total number of entries (least recently used entries are evicted first).
+
+Keys:
+    {prefix}:exact:{sha}     -> entry id (string, TTL)
+    {prefix}:entry:{id}      -> hash(response, message, embedding, bucket, exact)
+    {prefix}:bucket:{ctx}    -> sorted set of entry ids by last access
+    {prefix}:lru             -> sorted set of all entry ids by last access
+    {prefix}:stats           -> hash of shared hit/miss counters
+"""
+from typing import Dict, Optional
+import base64
+import hashlib
+import logging
+import re
+import time
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARABIC_MARKS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+PUNCTUATION = re.compile(r"[^\w\s]")
+ELONGATION = re.compile(r"(\w)\1{2,}")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, drop diacritics/tatweel/punctuation, collapse elongation and spaces"""
+    text = ARABIC_MARKS.sub("", text.lower())
+    text = PUNCTUATION.sub(" ", text)
+    text = ELONGATION.sub(r"\1", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Shared exact + near-duplicate cache of chat responses"""
+
+    def __init__(self, enabled: bool = False, ttl: int = 3600, max_entries: int = 10000,
+                 similarity_threshold: float = 0.95, bucket_size: int = 200,
+                 prefix: str = "response_cache"):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.bucket_size = bucket_size
+        self.prefix = prefix
+        self.redis = None
+
+    def context_key(self, intent: str, emotion: str, user_name: str) -> str:
+        return _digest(str(intent), str(emotion), normalize_message(user_name or ""))[:32]
+
+    async def lookup(self, message: str, context: str,
+                     embedding: Optional[np.ndarray] = None) -> Optional[Dict]:
+        """Return {"response", "match", "similarity"} for a cached reply, or None"""
+        if not self.enabled or self.redis is None:
+            return None
+
+        try:
+            normalized = normalize_message(message)
+            bucket_key = f"{self.prefix}:bucket:{context}"
+
+            entry_id = await self.redis.get(f"{self.prefix}:exact:{_digest(context, normalized)}")
+            if entry_id:
+                response = await self.redis.hget(f"{self.prefix}:entry:{entry_id}", "response")
+                if response is not None:
+                    await self._touch(entry_id, bucket_key)
+                    await self.redis.hincrby(f"{self.prefix}:stats", "exact_hits", 1)
+                    return {"response": response, "match": "exact", "similarity": 1.0}
+
+            if embedding is not None and self.similarity_threshold < 1.0:
+                match = await self._nearest(bucket_key, embedding)
+                if match is not None:
+                    entry_id, response, similarity = match
+                    await self._touch(entry_id, bucket_key)
+                    await self.redis.hincrby(f"{self.prefix}:stats", "semantic_hits", 1)
+                    return {"response": response, "match": "semantic", "similarity": similarity}
+
+            await self.redis.hincrby(f"{self.prefix}:stats", "misses", 1)
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+        return None
+
+    async def _nearest(self, bucket_key: str, embedding: np.ndarray):
+        entry_ids = await self.redis.zrevrange(bucket_key, 0, self.bucket_size - 1)
+        if not entry_ids:
+            return None
+
+        pipe = self.redis.pipeline(transaction=False)
+        for entry_id in entry_ids:
+            pipe.hmget(f"{self.prefix}:entry:{entry_id}", "embedding", "response")
+        rows = await pipe.execute()
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return None
+
+        live_ids, vectors, responses, expired = [], [], [], []
+        for entry_id, (encoded, response) in zip(entry_ids, rows):
+            if response is None:
+                expired.append(entry_id)  # entry hash hit its TTL
+                continue
+            if encoded is None:
+                continue
+            vector = np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+            if vector.shape[0] == query.shape[0]:
+                live_ids.append(entry_id)
+                vectors.append(vector)
+                responses.append(response)
+        if expired:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zrem(bucket_key, *expired)
+            pipe.zrem(f"{self.prefix}:lru", *expired)
+            await pipe.execute()
+        if not vectors:
+            return None
+
+        matrix = np.vstack(vectors)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        similarities = (matrix @ query) / (norms * query_norm)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        return live_ids[best], responses[best], float(similarities[best])
+
+    async def _touch(self, entry_id: str, bucket_key: str):
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(f"{self.prefix}:lru", {entry_id: now})
+        pipe.zadd(bucket_key, {entry_id: now})
+        await pipe.execute()
+
+    async def store(self, message: str, context: str, response: str,
+                    embedding: Optional[np.ndarray] = None):
+        """Cache a generated reply for this message and context"""
+        if not self.enabled or self.redis is None or not response:
+            return
+
+        try:
+            normalized = normalize_message(message)
+            entry_id = uuid.uuid4().hex
+            entry_key = f"{self.prefix}:entry:{entry_id}"
+            exact_key = f"{self.prefix}:exact:{_digest(context, normalized)}"
+            bucket_key = f"{self.prefix}:bucket:{context}"
+            now = time.time()
+
+            entry = {"response": response, "message": normalized, "bucket": bucket_key, "exact": exact_key}
+            if embedding is not None:
+                entry["embedding"] = base64.b64encode(
+                    np.asarray(embedding, dtype=np.float32).tobytes()
+                ).decode("ascii")
+
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hset(entry_key, mapping=entry)
+            pipe.expire(entry_key, self.ttl)
+            pipe.set(exact_key, entry_id, ex=self.ttl)
+            pipe.zadd(bucket_key, {entry_id: now})
+            pipe.zremrangebyrank(bucket_key, 0, -(self.bucket_size + 1))
+            pipe.expire(bucket_key, self.ttl)
+            pipe.zadd(f"{self.prefix}:lru", {entry_id: now})
+            pipe.hincrby(f"{self.prefix}:stats", "stores", 1)
+            await pipe.execute()
+
+            await self._evict()
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {e}")
+
+    async def _evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        overflow = await self.redis.zcard(f"{self.prefix}:lru") - self.max_entries
+        if overflow <= 0:
+            return
+
+        evicted = await self.redis.zpopmin(f"{self.prefix}:lru", overflow)
+        pipe = self.redis.pipeline(transaction=False)
+        for entry_id, _ in evicted:
+            pipe.hmget(f"{self.prefix}:entry:{entry_id}", "bucket", "exact")
+        locations = await pipe.execute()
+
+        pipe = self.redis.pipeline(transaction=False)
+        for (entry_id, _), (bucket_key, exact_key) in zip(evicted, locations):
+            pipe.delete(f"{self.prefix}:entry:{entry_id}")
+            if bucket_key:
+                pipe.zrem(bucket_key, entry_id)
+            if exact_key:
+                pipe.delete(exact_key)
+        pipe.hincrby(f"{self.prefix}:stats", "evictions", len(evicted))
+        await pipe.execute()
+
+    async def stats(self) -> Dict:
+        summary = {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+            "similarity_threshold": self.similarity_threshold
+        }
+        if not self.enabled or self.redis is None:
+            return summary
+
+        try:
+            counters = {k: int(v) for k, v in (await self.redis.hgetall(f"{self.prefix}:stats")).items()}
+            hits = counters.get("exact_hits", 0) + counters.get("semantic_hits", 0)
+            lookups = hits + counters.get("misses", 0)
+            summary.update(counters)
+            summary["entries"] = await self.redis.zcard(f"{self.prefix}:lru")
+            summary["hit_rate"] = hits / lookups if lookups else 0.0
+        except Exception as e:
+            logger.warning(f"Response cache stats failed: {e}")
+        return summary
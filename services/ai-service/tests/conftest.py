@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the service modules the way the container runs them (flat, from this directory)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_CACHE_DIR", "")
+os.environ.setdefault("VECTOR_INDEX_DIR", "")
+os.environ.setdefault("DATASET_SNAPSHOT", "")
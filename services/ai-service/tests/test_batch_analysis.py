@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import httpx
+
+from main import app
+
+LINES = 20000
+
+
+async def ndjson_chunks(lines: int, lines_per_chunk: int = 100):
+    """The body as many small chunks, like a chunked upload"""
+    for start in range(0, lines, lines_per_chunk):
+        batch = range(start, min(start + lines_per_chunk, lines))
+        yield "".join(json.dumps({"id": i, "text": f"فرحان برشا {i}"}) + "\n" for i in batch).encode("utf-8")
+
+
+async def post_batch(path: str, content) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # Body chunks lost to the disconnect listener used to stall the stream
+        return await asyncio.wait_for(
+            client.post(path, content=content, headers={"Content-Type": "application/x-ndjson"}), 60
+        )
+
+
+def result_rows(response: httpx.Response):
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+def test_large_chunked_ndjson_body_yields_one_row_per_line():
+    for path, field in (("/emotion-analysis/batch", "emotion"), ("/intent-recognition/batch", "intent")):
+        response = asyncio.run(post_batch(path, ndjson_chunks(LINES)))
+        assert response.status_code == 200
+
+        rows = result_rows(response)
+        assert len(rows) == LINES
+        assert [row["index"] for row in rows] == list(range(LINES))
+        assert [row["id"] for row in rows] == list(range(LINES))
+        assert all(field in row and "error" not in row for row in rows)
+
+
+def test_json_array_body():
+    response = asyncio.run(post_batch("/emotion-analysis/batch", json.dumps(["تعبت", {"id": "a", "text": "فرحان"}, 3])))
+    rows = result_rows(response)
+    assert [row["index"] for row in rows] == [0, 1, 2]
+    assert rows[1]["id"] == "a"
+    assert "error" in rows[2]
+
+
+def test_invalid_ndjson_line_reports_error_and_continues():
+    body = b'{"text": "ok"}\nnot json\n"plain string"\n'
+    rows = result_rows(asyncio.run(post_batch("/intent-recognition/batch", body)))
+    assert len(rows) == 3
+    assert "error" in rows[1] and "intent" in rows[2]
@@ -0,0 +1,35 @@
+import asyncio
+
+import httpx
+
+import main
+
+
+def test_collapsed_retry_saves_the_turn_once(monkeypatch):
+    history = []
+    generations = []
+
+    async def generate_chat(ollama_request, priority):
+        generations.append(ollama_request)
+        await asyncio.sleep(0.05)  # long enough for the retry to join
+        return {"message": {"content": "labes, w enti?"}}
+
+    async def save_session(session_id, messages, emotion=None):
+        history.extend(messages)
+
+    monkeypatch.setattr(main, "generate_chat", generate_chat)
+    monkeypatch.setattr(main, "save_session", save_session)
+
+    async def post_twice():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"message": "aslema", "session_id": "retry-session"}
+            responses = await asyncio.gather(client.post("/chat", json=body), client.post("/chat", json=body))
+        await main.session_writer.flush()
+        return responses
+
+    responses = asyncio.run(post_twice())
+    assert [response.status_code for response in responses] == [200, 200]
+    assert [response.json()["response"] for response in responses] == ["labes, w enti?"] * 2
+    assert len(generations) == 1
+    assert [message["role"] for message in history] == ["user", "assistant"]
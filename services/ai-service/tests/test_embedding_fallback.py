@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+import numpy as np
+
+import main
+
+
+def ollama_down(monkeypatch):
+    async def request_embeddings(texts, priority=main.INTERACTIVE):
+        raise httpx.ConnectError("Ollama is down")
+    monkeypatch.setattr(main, "EMBEDDING_BACKEND", "ollama")
+    monkeypatch.setattr(main, "request_embeddings", request_embeddings)
+
+
+def ollama_embedding():
+    """A query embedding as Ollama returns it once it is back (768 dims)"""
+    return np.ones(768, dtype=np.float32)
+
+
+def test_dialogue_index_built_without_ollama_is_searchable_once_it_is_back(monkeypatch):
+    ollama_down(monkeypatch)
+    db = main.DialogueDatabase()
+    asyncio.run(db._load_offline_dialogues())
+    assert db.index.metadata["model"] == main.local_embedder.model_id
+
+    query = db.dialogues[2]["text"]
+    found = asyncio.run(db.find_similar_dialogue(query, top_k=1, query_embedding=ollama_embedding()))
+    assert found == [db.dialogues[2]]
+
+
+def test_proverb_index_built_without_ollama_is_searchable_once_it_is_back(monkeypatch):
+    ollama_down(monkeypatch)
+    db = main.ProverbDatabase()
+    asyncio.run(db._load_offline_proverbs())
+    assert db.vector_index.metadata["model"] == main.local_embedder.model_id
+
+    query = db.proverbs[4]["text"]
+    found = asyncio.run(db.find_related_proverb(query, query_embedding=ollama_embedding()))
+    assert found == db.proverbs[4]
@@ -0,0 +1,31 @@
+import profile_cache
+from profile_cache import ProfileCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def defaults():
+    return {"name": None, "language_preference": "tn", "interaction_count": 0}
+
+
+def test_partial_refill_of_expired_entry_is_fresh(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(profile_cache.time, "monotonic", clock)
+    cache = ProfileCache(defaults, max_age=60.0)
+
+    cache.fill("s1", {"name": "Amine", "language_preference": "tn", "interaction_count": "3"},
+               cache.epoch, complete=True)
+    assert cache.get("s1", ["name"]) == {"name": "Amine"}
+
+    clock.now += 61.0
+    assert cache.get("s1", ["name"]) is None
+
+    cache.fill("s1", {"name": "Amina"}, cache.epoch)
+    assert cache.get("s1", ["name"]) == {"name": "Amina"}
+    assert cache.hits == 2 and cache.misses == 1
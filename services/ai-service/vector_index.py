@@ -0,0 +1,212 @@
+"""
+Dense vector indexes for the BMO AI service.
+
+Corpus embeddings are stored once as a contiguous, L2-normalized float32
+matrix so cosine similarity against a query becomes a single matrix-vector
+product instead of one comparison (and one embedding call) per row.
+
+Two interchangeable index kinds share the build/search/save/load interface:
+- ExactIndex: brute force over the whole matrix (perfect recall)
+- IVFIndex: inverted-file index that clusters rows with spherical k-means
+  and only scans the `n_probe` closest clusters per query, trading recall
+  for latency on large corpora
+"""
+from typing import Dict, Optional, Tuple
+import json
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return a contiguous float32 copy of `vectors` with unit-length rows"""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_scores(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Positions of the top_k highest scores, best first"""
+    k = min(top_k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class ExactIndex:
+    """Brute-force cosine similarity over a normalized embedding matrix"""
+
+    kind = "exact"
+
+    def __init__(self):
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.metadata: Dict = {}
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def build(self, vectors: np.ndarray):
+        """Store the normalized corpus matrix (one row per item)"""
+        self.matrix = normalize_rows(vectors)
+
+    def _prepare_query(self, query: np.ndarray) -> np.ndarray:
+        query = normalize_rows(query)[0]
+        if query.shape[0] != self.dim:
+            raise ValueError(
+                f"Query dimension {query.shape[0]} does not match index dimension {self.dim}"
+            )
+        return query
+
+    def search(self, query: np.ndarray, top_k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, cosine scores) of the top_k rows, best first"""
+        if len(self) == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = self._prepare_query(query)
+        scores = self.matrix @ query
+        order = top_k_scores(scores, top_k)
+        return order, scores[order]
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {"matrix": self.matrix}
+
+    def _restore(self, arrays, params: Dict):
+        self.matrix = np.ascontiguousarray(arrays["matrix"], dtype=np.float32)
+
+    def _params(self) -> Dict:
+        return {}
+
+    def save(self, path: str):
+        """Write the index to an uncompressed .npz file"""
+        header = {"kind": self.kind, "params": self._params(), "metadata": self.metadata}
+        with open(path, "wb") as index_file:
+            np.savez(index_file, header=np.array(json.dumps(header)), **self._arrays())
+
+
+class IVFIndex(ExactIndex):
+    """Inverted-file (IVF-flat) index over normalized embeddings"""
+
+    kind = "ivf"
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8,
+                 iterations: int = 10, seed: int = 0):
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.row_ids = np.empty(0, dtype=np.int64)  # matrix row -> original id
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+
+    def _assign(self, matrix: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        assignments = np.empty(matrix.shape[0], dtype=np.int64)
+        for start in range(0, matrix.shape[0], chunk):
+            assignments[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ centroids.T, axis=1)
+        return assignments
+
+    def build(self, vectors: np.ndarray):
+        """Cluster rows with spherical k-means and group them by cluster"""
+        matrix = normalize_rows(vectors)
+        n_rows = matrix.shape[0]
+        if n_rows == 0:
+            self.matrix = matrix
+            return
+
+        n_lists = self.n_lists or int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+        rng = np.random.default_rng(self.seed)
+        centroids = matrix[rng.choice(n_rows, n_lists, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignments = self._assign(matrix, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Reseed empty clusters with random rows so every list is used
+                sums[empty] = matrix[rng.choice(n_rows, int(empty.sum()), replace=False)]
+            centroids = normalize_rows(sums)
+
+        assignments = self._assign(matrix, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+
+        self.centroids = centroids
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.row_ids = order.astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def search(self, query: np.ndarray, top_k: int = 3,
+               n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search only the n_probe closest lists (higher = better recall, slower)"""
+        if len(self) == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = self._prepare_query(query)
+        n_probe = max(1, min(n_probe or self.n_probe, self.centroids.shape[0]))
+        probed = top_k_scores(self.centroids @ query, n_probe)
+
+        rows = np.concatenate([
+            np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in probed
+        ])
+        scores = self.matrix[rows] @ query
+        order = top_k_scores(scores, top_k)
+        return self.row_ids[rows[order]], scores[order]
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "matrix": self.matrix,
+            "centroids": self.centroids,
+            "row_ids": self.row_ids,
+            "list_offsets": self.list_offsets
+        }
+
+    def _restore(self, arrays, params: Dict):
+        super()._restore(arrays, params)
+        self.centroids = np.ascontiguousarray(arrays["centroids"], dtype=np.float32)
+        self.row_ids = arrays["row_ids"].astype(np.int64)
+        self.list_offsets = arrays["list_offsets"].astype(np.int64)
+        self.n_lists = params.get("n_lists")
+        self.n_probe = params.get("n_probe", self.n_probe)
+
+    def _params(self) -> Dict:
+        return {"n_lists": int(self.centroids.shape[0]), "n_probe": self.n_probe}
+
+
+INDEX_KINDS = {
+    ExactIndex.kind: ExactIndex,
+    IVFIndex.kind: IVFIndex
+}
+
+
+def create_index(kind: str = "auto", n_rows: int = 0, ann_min_rows: int = 5000, **params) -> ExactIndex:
+    """Create an empty index; "auto" picks IVF only for corpora of ann_min_rows or more"""
+    if kind == "auto":
+        kind = IVFIndex.kind if n_rows >= ann_min_rows else ExactIndex.kind
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown vector index kind: {kind}")
+    if kind == ExactIndex.kind:
+        return ExactIndex()
+    return IVFIndex(**params)
+
+
+def load_index(path: str) -> ExactIndex:
+    """Load an index written by `save`, whatever its kind"""
+    with np.load(path, allow_pickle=False) as arrays:
+        header = json.loads(str(arrays["header"]))
+        index = INDEX_KINDS[header["kind"]]()
+        index._restore(arrays, header.get("params", {}))
+        index.metadata = header.get("metadata", {})
+    return index
@@ -1,6 +1,7 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 import os
 import logging
@@ -8,12 +9,27 @@ from typing import Optional
 import json
 from datetime import datetime
 
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+from metrics import LATENCY_BUCKETS, RequestMetrics, request_histogram
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="BMO API Gateway")
 
+# Prometheus metrics, served on /metrics
+app.add_middleware(RequestMetrics, histogram=request_histogram(
+    "bmo_gateway_http_request_duration_seconds",
+    "Gateway request latency by route (to the end of the response body)"
+))
+chat_complete_stages = Histogram(
+    "bmo_gateway_chat_complete_stage_seconds",
+    "Time /chat-complete spends waiting on each downstream service",
+    ("stage",), buckets=LATENCY_BUCKETS
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -45,6 +61,17 @@ async def check_service_health(service_url: str, service_name: str) -> bool:
         logger.warning(f"{service_name} health check failed: {e}")
         return False
 
+def raise_if_overloaded(response: httpx.Response):
+    """Pass an upstream 503 on with its Retry-After so clients back off instead of failing"""
+    if response.status_code == 503:
+        retry_after = response.headers.get("Retry-After", "1")
+        logger.warning(f"Upstream overloaded, retry after {retry_after}s: {response.request.url}")
+        raise HTTPException(
+            status_code=503,
+            detail="AI service busy, retry later",
+            headers={"Retry-After": retry_after}
+        )
+
 # ==========================================
 # ROOT ENDPOINT
 # ==========================================
@@ -57,12 +84,16 @@ async def root():
         "timestamp": datetime.now().isoformat(),
         "endpoints": {
             "chat": "/ai/chat",
+            "chat_stream": "/ai/chat/stream",
             "emotion_analysis": "/ai/emotion-analysis",
             "intent_recognition": "/ai/intent-recognition",
+            "emotion_analysis_batch": "/ai/emotion-analysis/batch",
+            "intent_recognition_batch": "/ai/intent-recognition/batch",
             "text_to_speech": "/voice/text-to-speech",
             "speech_to_text": "/voice/speech-to-text",
             "user_profile": "/user/{session_id}",
-            "health": "/health"
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
@@ -77,9 +108,12 @@ async def ai_chat(request: Request):
         logger.info(f"Chat request: session={body.get('session_id', 'unknown')}")
         
         response = await client.post(f"{AI_SERVICE}/chat", json=body)
+        raise_if_overloaded(response)
         response.raise_for_status()
         
         return response.json()
+    except HTTPException:
+        raise
     except httpx.HTTPError as e:
         logger.error(f"AI service error: {e}")
         raise HTTPException(status_code=503, detail="AI service unavailable")
@@ -87,6 +121,36 @@ async def ai_chat(request: Request):
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ai/chat/stream")
+async def ai_chat_stream(request: Request):
+    """Proxy streamed chat tokens (Server-Sent Events) from the AI service without buffering"""
+    try:
+        body = await request.json()
+        logger.info(f"Chat stream request: session={body.get('session_id', 'unknown')}")
+        
+        upstream_request = client.build_request("POST", f"{AI_SERVICE}/chat/stream", json=body)
+        upstream = await client.send(upstream_request, stream=True)
+        if upstream.status_code != 200:
+            await upstream.aread()
+            await upstream.aclose()
+            raise_if_overloaded(upstream)
+            upstream.raise_for_status()
+        
+        return StreamingResponse(
+            upstream.aiter_raw(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(upstream.aclose)
+        )
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        logger.error(f"AI service stream error: {e}")
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/ai/emotion-analysis")
 async def emotion_analysis(text: str):
     """Analyze emotion of text"""
@@ -121,6 +185,49 @@ async def intent_recognition(text: str):
         logger.error(f"Intent recognition error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def proxy_batch(request: Request, path: str) -> StreamingResponse:
+    """Stream a batch body to the AI service and its NDJSON results back, buffering neither"""
+    try:
+        upstream_request = client.build_request(
+            "POST",
+            f"{AI_SERVICE}{path}",
+            content=request.stream(),
+            headers={"Content-Type": request.headers.get("content-type", "application/json")}
+        )
+        upstream = await client.send(upstream_request, stream=True)
+        if upstream.status_code != 200:
+            await upstream.aread()
+            await upstream.aclose()
+            if upstream.status_code == 400:
+                raise HTTPException(status_code=400, detail=upstream.json().get("detail"))
+            upstream.raise_for_status()
+        
+        return StreamingResponse(
+            upstream.aiter_raw(),
+            media_type="application/x-ndjson",
+            background=BackgroundTask(upstream.aclose)
+        )
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        logger.error(f"AI service batch error: {e}")
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+    except Exception as e:
+        logger.error(f"Batch analysis error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/ai/emotion-analysis/batch")
+async def emotion_analysis_batch(request: Request):
+    """Analyze emotions for a JSON array or NDJSON stream of texts (NDJSON results)"""
+    logger.info("Batch emotion analysis")
+    return await proxy_batch(request, "/emotion-analysis/batch")
+
+@app.post("/ai/intent-recognition/batch")
+async def intent_recognition_batch(request: Request):
+    """Recognize intents for a JSON array or NDJSON stream of texts (NDJSON results)"""
+    logger.info("Batch intent recognition")
+    return await proxy_batch(request, "/intent-recognition/batch")
+
 @app.post("/ai/set-user")
 async def set_user(session_id: str, name: str):
     """Set user name in AI service"""
@@ -152,18 +259,37 @@ async def get_user_profile(session_id: str):
         logger.error(f"Get user profile error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def proxy_stats(request: Request, path: str) -> Response:
+    """Relay a stats body from the AI service, passing If-None-Match / ETag / 304 through"""
+    headers = {}
+    if "if-none-match" in request.headers:
+        headers["If-None-Match"] = request.headers["if-none-match"]
+    response = await client.get(f"{AI_SERVICE}{path}", headers=headers)
+    etag = {"ETag": response.headers["etag"]} if "etag" in response.headers else {}
+    if response.status_code == 304:
+        return Response(status_code=304, headers=etag)
+    response.raise_for_status()
+    
+    return Response(response.content, media_type="application/json", headers=etag)
+
 @app.get("/ai/dialogue-stats")
-async def get_dialogue_stats():
-    """Get statistics about available dialogue dataset"""
+async def get_dialogue_stats(request: Request):
+    """Get statistics about available dialogue dataset (ETag / If-None-Match passed through)"""
     try:
-        response = await client.get(f"{AI_SERVICE}/dialogue-stats")
-        response.raise_for_status()
-        
-        return response.json()
+        return await proxy_stats(request, "/dialogue-stats")
     except Exception as e:
         logger.error(f"Dialogue stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/ai/proverb-stats")
+async def get_proverb_stats(request: Request):
+    """Get statistics about available proverbs dataset (ETag / If-None-Match passed through)"""
+    try:
+        return await proxy_stats(request, "/proverb-stats")
+    except Exception as e:
+        logger.error(f"Proverb stats error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ==========================================
 # VOICE SERVICE ROUTES (ENHANCED)
 # ==========================================
@@ -226,9 +352,12 @@ async def generate_emotional_response(text: str, session_id: str):
             f"{VOICE_SERVICE}/generate-emotional-response",
             params={"text": text, "session_id": session_id}
         )
+        raise_if_overloaded(response)
         response.raise_for_status()
         
         return response.json()
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Emotional response error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -259,10 +388,12 @@ async def full_chat_with_voice(request: Request):
         logger.info(f"Full chat with voice: session={session_id}")
         
         # Step 1: Get AI response with emotion
-        ai_response = await client.post(
-            f"{AI_SERVICE}/chat",
-            json=body
-        )
+        with chat_complete_stages.labels(stage="ai_chat").time():
+            ai_response = await client.post(
+                f"{AI_SERVICE}/chat",
+                json=body
+            )
+        raise_if_overloaded(ai_response)
         ai_response.raise_for_status()
         ai_data = ai_response.json()
         
@@ -273,11 +404,12 @@ async def full_chat_with_voice(request: Request):
             "emotion": ai_data.get("detected_emotion", "neutral")
         }
         
-        tts_response = await client.post(
-            f"{VOICE_SERVICE}/text-to-speech",
-            json=tts_request,
-            timeout=30.0
-        )
+        with chat_complete_stages.labels(stage="tts").time():
+            tts_response = await client.post(
+                f"{VOICE_SERVICE}/text-to-speech",
+                json=tts_request,
+                timeout=30.0
+            )
         tts_response.raise_for_status()
         
         # Return combined response
@@ -289,6 +421,8 @@ async def full_chat_with_voice(request: Request):
             "timestamp": ai_data.get("timestamp", datetime.now().isoformat())
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Full chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -366,10 +500,13 @@ async def health_check():
             "services": {}
         }
         
-        # Check AI service
+        # Check AI service (readiness: Redis and corpora/indexes loaded)
         try:
             response = await client.get(f"{AI_SERVICE}/health", timeout=5.0)
             health["services"]["ai"] = response.json()
+            readiness = await client.get(f"{AI_SERVICE}/readyz", timeout=5.0)
+            health["services"]["ai"]["ready"] = readiness.status_code == 200
+            health["services"]["ai"]["readiness"] = readiness.json()
         except Exception as e:
             logger.warning(f"AI service health check failed: {e}")
             health["services"]["ai"] = {
@@ -399,12 +536,18 @@ async def health_check():
                 "error": str(e)
             }
         
-        # Overall status
+        # Overall status: a live AI service that is still loading is "warming"
         all_healthy = all(
             service.get("status") == "healthy"
             for service in health["services"].values()
         )
-        health["overall_status"] = "healthy" if all_healthy else "degraded"
+        ai_ready = health["services"]["ai"].get("ready", False)
+        if all_healthy and ai_ready:
+            health["overall_status"] = "healthy"
+        elif all_healthy and health["services"]["ai"].get("readiness", {}).get("status") == "warming":
+            health["overall_status"] = "warming"
+        else:
+            health["overall_status"] = "degraded"
         
         return health
         
@@ -412,18 +555,37 @@ async def health_check():
         logger.error(f"Health check error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics for the gateway itself (each service serves its own)"""
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 # ==========================================
 # ANALYTICS
 # ==========================================
+# Last dialogue stats body and its ETag: /stats revalidates it with the AI
+# service (304, no body) instead of fetching it again on every refresh
+dialogue_stats_cache = {"etag": None, "stats": {}}
+
+async def fetch_dialogue_stats() -> dict:
+    headers = {"If-None-Match": dialogue_stats_cache["etag"]} if dialogue_stats_cache["etag"] else {}
+    response = await client.get(f"{AI_SERVICE}/dialogue-stats", headers=headers)
+    if response.status_code == 304:
+        return dialogue_stats_cache["stats"]
+    if response.status_code != 200:
+        return {}
+    dialogue_stats_cache.update(etag=response.headers.get("etag"), stats=response.json())
+    return dialogue_stats_cache["stats"]
+
 @app.get("/stats")
 async def get_stats():
     """Get overall statistics"""
     try:
-        ai_stats = await client.get(f"{AI_SERVICE}/dialogue-stats")
+        dialogue_stats = await fetch_dialogue_stats()
         voice_config = await client.get(f"{VOICE_SERVICE}/voice-config")
         
         return {
-            "dialogues": ai_stats.json() if ai_stats.status_code == 200 else {},
+            "dialogues": dialogue_stats,
             "voice": voice_config.json() if voice_config.status_code == 200 else {},
             "timestamp": datetime.now().isoformat()
         }
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict
@@ -7,8 +8,18 @@ import subprocess
 import platform
 import os
 
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from metrics import RequestMetrics, request_histogram
+
 app = FastAPI(title="BMO Task Service")
 
+# Prometheus metrics, served on /metrics
+app.add_middleware(RequestMetrics, histogram=request_histogram(
+    "bmo_task_http_request_duration_seconds",
+    "Task service request latency by route"
+))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -210,6 +221,11 @@ async def android_intent(request: TaskRequest):
         "app": app_name
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics"""
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "bmo-task"}
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 import httpx
@@ -10,6 +10,12 @@ import asyncio
 import logging
 from datetime import datetime
 
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+
+from metrics import LATENCY_BUCKETS, RequestMetrics, request_histogram
+from single_flight import SingleFlight, fingerprint
+
 # Google Cloud imports (optional)
 try:
     from google.cloud import texttospeech
@@ -24,6 +30,15 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="BMO Voice Service")
 
+# Prometheus metrics, served on /metrics
+app.add_middleware(RequestMetrics, histogram=request_histogram(
+    "bmo_voice_http_request_duration_seconds",
+    "Voice service request latency by route (to the end of the response body)"
+))
+tts_seconds = Histogram(
+    "bmo_voice_tts_seconds", "Speech synthesis time by provider", ("provider",), buckets=LATENCY_BUCKETS
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -49,6 +64,24 @@ if GOOGLE_AVAILABLE:
 else:
     tts_client = None
 
+# Identical concurrent synthesis requests (retries, several tabs) share one call
+tts_flights = SingleFlight()
+
+class SingleFlightStats:
+    """Single-flight counters, exported as they are at scrape time"""
+    def describe(self):
+        return []
+
+    def collect(self):
+        for counter in ("calls", "collapsed"):
+            family = CounterMetricFamily(
+                f"bmo_single_flight_{counter}", f"Single-flight {counter} by call type", labels=("call",)
+            )
+            family.add_metric(["tts"], tts_flights.stats()[counter])
+            yield family
+
+REGISTRY.register(SingleFlightStats())
+
 # ==========================================
 # DATA MODELS
 # ==========================================
@@ -146,12 +179,17 @@ async def text_to_speech_google(
             speaking_rate=emotion_params["speaking_rate"]
         )
         
-        # Synthesize speech
-        response = tts_client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
-        )
+        # Synthesize speech (blocking client call, run off the event loop)
+        with tts_seconds.labels(provider="google").time():
+            response = await tts_flights.do(
+                fingerprint("google", text, language, voice_name, emotion_params),
+                lambda: asyncio.to_thread(
+                    tts_client.synthesize_speech,
+                    input=synthesis_input,
+                    voice=voice,
+                    audio_config=audio_config
+                )
+            )
         
         logger.info(f"Generated audio for emotion: {emotion}")
         return response.audio_content
@@ -187,23 +225,28 @@ async def text_to_speech_espeak(
         speed = int(150 * emotion_params["speaking_rate"])
         pitch = 50 + (emotion_params["pitch"] // 2)
         
-        # Run espeak command
-        process = await asyncio.create_subprocess_exec(
-            "espeak",
-            f"-l{lang}",
-            f"-s{speed}",
-            f"-p{pitch}",
-            "-mmp3",
-            text,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        stdout, stderr = await process.communicate()
+        async def run_espeak() -> bytes:
+            process = await asyncio.create_subprocess_exec(
+                "espeak",
+                f"-l{lang}",
+                f"-s{speed}",
+                f"-p{pitch}",
+                "-mmp3",
+                text,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            
+            stdout, stderr = await process.communicate()
+            
+            if process.returncode != 0:
+                logger.error(f"eSpeak error: {stderr}")
+                raise Exception(f"eSpeak failed: {stderr}")
+            return stdout
         
-        if process.returncode != 0:
-            logger.error(f"eSpeak error: {stderr}")
-            raise Exception(f"eSpeak failed: {stderr}")
+        # Run espeak command
+        with tts_seconds.labels(provider="espeak").time():
+            stdout = await tts_flights.do(fingerprint("espeak", text, lang, speed, pitch), run_espeak)
         
         logger.info(f"Generated audio with eSpeak for emotion: {emotion}")
         return stdout
@@ -322,6 +365,13 @@ async def generate_emotional_response(
                 "language": "ar"
             }
         )
+        if ai_response.status_code == 503:
+            # AI service is shedding load: let the caller back off and retry
+            raise HTTPException(
+                status_code=503,
+                detail="AI service busy, retry later",
+                headers={"Retry-After": ai_response.headers.get("Retry-After", "1")}
+            )
         
         response_data = ai_response.json()
         ai_text = response_data.get("response", "")
@@ -341,6 +391,8 @@ async def generate_emotional_response(
             "audio": audio_response.hex()  # Convert to hex for JSON serialization
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Emotional response generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -492,9 +544,15 @@ async def health_check():
         "status": "healthy",
         "service": "bmo-voice",
         "google_tts_available": GOOGLE_AVAILABLE and tts_client is not None,
-        "tts_provider": TTS_PROVIDER
+        "tts_provider": TTS_PROVIDER,
+        "single_flight": {"tts": tts_flights.stats()}
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request latency and synthesis time"""
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 @app.get("/voice-config")
 async def get_voice_config():
     """Get available voice configurations"""
@@ -0,0 +1,58 @@
+"""
+Single-flight deduplication of identical in-flight calls.
+
+The first caller for a fingerprint starts the call; every caller that
+arrives while it is still running awaits the same future instead of issuing
+its own. Nothing is cached: once the call finishes, the next caller starts a
+fresh one. The call runs as its own task, so a caller that goes away (client
+disconnect) does not cancel it for the others.
+
+ai-service and voice-service are each built from their own directory, so
+both carry this module; keep the two copies identical.
+"""
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+import asyncio
+import hashlib
+import json
+
+T = TypeVar("T")
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable digest of JSON-serializable request parts"""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one upstream call"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of `call()`, shared with concurrent callers of `key`"""
+        self.calls += 1
+        task = self._calls.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            task = self._calls[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # every caller may have left; don't log it as unretrieved
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "upstream_calls": self.calls - self.collapsed,
+            "in_flight": len(self._calls)
+        }